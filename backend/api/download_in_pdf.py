@@ -1,5 +1,9 @@
+import hashlib
 import io
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
 
+from django.core.cache import caches
 from django.http import FileResponse
 from foodgram.settings import FONTS_FILES_DIR
 from reportlab.lib.pagesizes import letter
@@ -8,40 +12,99 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = 'Helvetica'
+FILE_NAME = 'shopping_list.pdf'
+TITLE = 'Список покупок:'
+LINE_HEIGHT = 20
+PAGE_BOTTOM = 780
+# Готовые PDF храним в дисковом кэше shopping_lists, пока корзина
+# не изменится: в памяти процесса они бы копились на каждом воркере.
+CACHE_ALIAS = 'shopping_lists'
+CACHE_MAX_SIZE = 1024 * 1024
+# Больше этого размера PDF пишется во временный файл, а не в память.
+SPOOL_MAX_SIZE = 1024 * 1024
 
-def create_pdf_file(request):
-    # Устанавливаем шрифты
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
     pdfmetrics.registerFont(
-        TTFont('Helvetica', FONTS_FILES_DIR, 'UTF-8')
+        TTFont(FONT_NAME, FONTS_FILES_DIR, 'UTF-8')
+    )
+    return FONT_NAME
+
+
+def format_line(number, ingredient):
+    """Строка списка покупок для одного агрегированного ингредиента."""
+    return (
+        f"{number}. {ingredient['ingredient__name']}, "
+        f"{ingredient['total_ingredient_amount']} "
+        f"{ingredient['ingredient__measurement_unit']}."
     )
-    # Создаём буфер
-    buf = io.BytesIO()
-    # Создаём канвас
-    pdf = canvas.Canvas(buf, pagesize=letter, bottomup=0)
-    # Создаём строковый объект
+
+
+def format_lines(ingredients):
+    """Строки списка покупок по мере чтения ингредиентов."""
+    for number, ingredient in enumerate(ingredients, start=1):
+        yield format_line(number, ingredient)
+
+
+def render_pdf(lines, file):
+    """Рисует список покупок постранично в файловый объект.
+
+    Строки берутся из итератора по одной и в памяти не собираются.
+    Готовые страницы reportlab хранит сжатыми до save(): таблица
+    ссылок PDF пишется в конце файла.
+    """
+    font = register_font()
+    pdf = canvas.Canvas(file, pagesize=letter, bottomup=0)
     pdf.translate(cm, cm)
-    pdf.setFont('Helvetica', 18)
-    pdf.drawString(200, 5, 'Список покупок:')
-    pdf.setFont('Helvetica', 14)
-    down_param = 20
-    for number, ingredient in enumerate(request, start=1):
-        pdf.drawString(
-            10,
-            down_param,
-            f"{number}. {ingredient['ingredient__name']}, "
-            f"{ingredient['total_ingredient_amount']} "
-            f"{ingredient['ingredient__measurement_unit']}.",
-        )
-        down_param += 20
-        if down_param >= 780:
-            down_param = 20
+    pdf.setFont(font, 18)
+    pdf.drawString(200, 5, TITLE)
+    pdf.setFont(font, 14)
+    down_param = LINE_HEIGHT
+    for line in lines:
+        pdf.drawString(10, down_param, line)
+        down_param += LINE_HEIGHT
+        if down_param >= PAGE_BOTTOM:
+            down_param = LINE_HEIGHT
             pdf.showPage()
-            pdf.setFont('Helvetica', 16)
+            pdf.setFont(font, 16)
     pdf.showPage()
     pdf.save()
+
+
+def get_cache_key(lines):
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode())
+        digest.update(b'\n')
+    return f'shopping_list_pdf:{digest.hexdigest()}'
+
+
+def create_pdf_file(ingredients):
+    """PDF списка покупок из кверисета агрегированных ингредиентов.
+
+    Кверисет читается итератором дважды: сначала ради ключа кэша,
+    затем, если PDF в кэше нет, ради самих страниц.
+    """
+    cache = caches[CACHE_ALIAS]
+    cache_key = get_cache_key(format_lines(ingredients.iterator()))
+    content = cache.get(cache_key)
+    if content is not None:
+        return FileResponse(
+            io.BytesIO(content),
+            as_attachment=True,
+            filename=FILE_NAME
+        )
+    buf = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    render_pdf(format_lines(ingredients.iterator()), buf)
+    if buf.tell() <= CACHE_MAX_SIZE:
+        buf.seek(0)
+        cache.set(cache_key, buf.read())
     buf.seek(0)
     return FileResponse(
         buf,
         as_attachment=True,
-        filename='shopping_list.pdf'
+        filename=FILE_NAME
     )
@@ -1,12 +1,35 @@
+from django import forms
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
 from django_filters import FilterSet
 from django_filters import rest_framework as filters
+from recipes.cache import get_version
 from recipes.models import Ingredient, Recipe, Tag
 
+from .search import search_ingredients
+
+_tag_ids = None
+
+
+def get_tag_ids():
+    """Словарь slug -> id, пересобранный после изменения тегов."""
+    global _tag_ids
+    version = get_version(Tag)
+    if _tag_ids is None or _tag_ids[0] != version:
+        _tag_ids = (version, dict(Tag.objects.values_list('slug', 'id')))
+    return _tag_ids[1]
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список целых через запятую: ?author=1,2."""
+
+    field_class = forms.IntegerField
+
 
 class RecipeFilter(FilterSet):
-    author = filters.CharFilter(
-        field_name='author__id',
-        lookup_expr='icontains'
+    author = IntegerInFilter(
+        field_name='author_id',
+        lookup_expr='in'
     )
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited',
@@ -16,12 +39,31 @@ class RecipeFilter(FilterSet):
         field_name='is_in_shopping_cart',
         method='get_is_in_shopping_cart'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(method='get_tags')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'По числу добавлений в избранное'),
+            ('trending', 'По свежему избранному'),
+        ),
+        method='get_ordering'
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Функция, а не связанный метод: поле формы копирует choices
+        # через deepcopy, а функции копируются по ссылке.
+        self.filters['tags'].extra['choices'] = lambda: [
+            (slug, slug) for slug in self.tag_ids
+        ]
+
+    @cached_property
+    def tag_ids(self):
+        """Словарь slug -> id, один на запрос.
+
+        Проверка слагов и их перевод в id видят одну версию тегов.
+        """
+        return get_tag_ids()
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
             return queryset.filter(favorites__user=self.request.user)
@@ -32,13 +74,43 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def get_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, без JOIN и DISTINCT.
+
+        Слаги переводятся в id по словарю, полученному при создании
+        фильтра, поэтому таблица тегов в запрос не попадает.
+        """
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=[self.tag_ids[slug] for slug in value]
+            )
+        ))
+
+    def get_ordering(self, queryset, name, value):
+        """Сортировка по заранее посчитанным полям под индексом.
+
+        popular идёт по счётчику favorites_count, trending по полю
+        Recipe.trending, которое обновляет refresh_recipe_scores.
+        Оба поля лежат в самом рецепте и покрыты составными индексами.
+        """
+        if value == 'popular':
+            return queryset.order_by('-favorites_count', '-pub_date', '-id')
+        return queryset.order_by('-trending', '-pub_date', '-id')
+
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+            'ordering'
+        ]
 
 
 class IngredientSearchFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='search_name')
+
+    def search_name(self, queryset, name, value):
+        return search_ingredients(queryset, value)
 
     class Meta:
         model = Ingredient
@@ -0,0 +1,368 @@
+import base64
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from io import BytesIO
+
+import django
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver, resolve
+from PIL import Image
+from recipes.management.commands.generate_data import PREFIX
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+PASSWORD = 'Benchmark-password-1'
+BENCH_NAME = f'{PREFIX}benchmark'
+
+# Сценарий: prepare() вызывается перед каждым замером и может вернуть
+# путь, если он зависит от подготовленных данных.
+Case = namedtuple(
+    'Case', 'name method path data client status prepare',
+    defaults=(None, 'user', 200, None)
+)
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def get_routes():
+    """Маршруты API, до которых может дойти запрос.
+
+    djoser.urls повторяет маршруты пользователей из роутера, такие
+    дубли перекрыты и не учитываются.
+    """
+    routes = {}
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route)
+            elif 'format' not in route:
+                routes.setdefault(route, pattern.name)
+
+    walk(get_resolver().url_patterns, '')
+    return {
+        route: name for route, name in routes.items()
+        if route.startswith('api/')
+    }
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Замеряет все маршруты API через тестовый клиент.
+
+    Нужны данные generate_data. Для каждого сценария считаются p50 и
+    p95 времени ответа, число запросов к БД и пик выделенной памяти.
+    Результат в JSON можно сохранить и сравнить с другим коммитом:
+
+        benchmark_api --output before.json
+        benchmark_api --compare before.json
+    """
+
+    help = 'Нагрузочный замер маршрутов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+        parser.add_argument('--compare', help='JSON прошлого замера.')
+        parser.add_argument('--filter', default='',
+                            help='Только сценарии с этой подстрокой.')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('pk')[:3])
+        if len(users) < 3 or not Recipe.objects.exists():
+            raise CommandError('Нет данных, сначала выполните generate_data.')
+        self.user, self.other, self.author = users
+        for user in (self.user, self.other):
+            user.set_password(PASSWORD)
+            user.save(update_fields=('password',))
+        self.clients = {
+            'anon': APIClient(),
+            'user': self.get_client(self.user),
+            'other': APIClient(),
+        }
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            MEDIA_ROOT=media_root,
+            IMAGE_PROCESSING_ASYNC=False,
+        ):
+            # Ожидаемые ответы 4xx не должны засорять вывод.
+            logging.disable(logging.WARNING)
+            try:
+                results = self.run_cases(options)
+            finally:
+                logging.disable(logging.NOTSET)
+                Recipe.objects.filter(name=BENCH_NAME).delete()
+        report = {
+            'meta': {
+                'revision': get_git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'favorites': Favorite.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = {
+                    result['name']: result
+                    for result in json.load(file)['results']
+                }
+        self.print_report(results, baseline)
+
+    def get_client(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def get_cases(self):
+        user, other, author = self.user, self.other, self.author
+        recipe = Recipe.objects.filter(
+            name__startswith=PREFIX
+        ).order_by('-pub_date', '-id').first()
+        own = Recipe.objects.create(
+            author=user, name=BENCH_NAME, text='Замер', cooking_time=1
+        )
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True)[:5])
+        tags = list(Tag.objects.values_list('pk', flat=True)[:2])
+        tag_slugs = '&'.join(
+            f'tags={slug}'
+            for slug in Tag.objects.values_list('slug', flat=True)
+        )
+        recipe_data = {
+            'name': BENCH_NAME,
+            'text': 'Замер',
+            'cooking_time': 10,
+            'image': get_image(),
+            'tags': tags,
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredients
+            ],
+        }
+
+        def new_recipe():
+            created = Recipe.objects.create(
+                author=user, name=BENCH_NAME, text='Замер', cooking_time=1
+            )
+            return f'/api/recipes/{created.pk}/'
+
+        def relation(model, present, **fields):
+            def prepare():
+                if present:
+                    model.objects.get_or_create(**fields)
+                else:
+                    model.objects.filter(**fields).delete()
+            return prepare
+
+        def logout():
+            Token.objects.filter(user=other).delete()
+            token = Token.objects.create(user=other)
+            self.clients['other'].credentials(
+                HTTP_AUTHORIZATION=f'Token {token.key}'
+            )
+
+        recipe_url = f'/api/recipes/{recipe.pk}/'
+        return [
+            Case('api root', 'get', '/api/'),
+            Case('users list', 'get', '/api/users/', client='anon'),
+            Case('users create', 'post', '/api/users/', {}, 'anon', 400),
+            Case('users detail', 'get', f'/api/users/{author.pk}/'),
+            Case('users me', 'get', '/api/users/me/'),
+            Case('users subscriptions', 'get',
+                 '/api/users/subscriptions/?recipes_limit=3'),
+            Case('users subscribe', 'post',
+                 f'/api/users/{author.pk}/subscribe/', status=201,
+                 prepare=relation(Follow, False, user=user, author=author)),
+            Case('users unsubscribe', 'delete',
+                 f'/api/users/{author.pk}/subscribe/', status=204,
+                 prepare=relation(Follow, True, user=user, author=author)),
+            Case('users set password', 'post', '/api/users/set_password/',
+                 {'current_password': PASSWORD, 'new_password': PASSWORD},
+                 status=204),
+            Case('users set username', 'post', '/api/users/set_username/',
+                 {}, status=400),
+            Case('users reset username', 'post',
+                 '/api/users/reset_username/', {}, 'anon', 400),
+            Case('users reset username confirm', 'post',
+                 '/api/users/reset_username_confirm/', {}, 'anon', 400),
+            Case('users activation', 'post', '/api/users/activation/',
+                 {}, 'anon', 400),
+            Case('users resend activation', 'post',
+                 '/api/users/resend_activation/', {}, 'anon', 400),
+            Case('users reset password', 'post',
+                 '/api/users/reset_password/', {}, 'anon', 400),
+            Case('users reset password confirm', 'post',
+                 '/api/users/reset_password_confirm/', {}, 'anon', 400),
+            Case('token login', 'post', '/api/auth/token/login/',
+                 {'email': other.email, 'password': PASSWORD}, 'anon'),
+            Case('token logout', 'post', '/api/auth/token/logout/',
+                 client='other', status=204, prepare=logout),
+            Case('tags list', 'get', '/api/tags/', client='anon'),
+            Case('tags detail', 'get', f'/api/tags/{tags[0]}/',
+                 client='anon'),
+            Case('ingredients list', 'get', '/api/ingredients/',
+                 client='anon'),
+            Case('ingredients search', 'get', '/api/ingredients/?name=со',
+                 client='anon'),
+            Case('ingredients detail', 'get',
+                 f'/api/ingredients/{ingredients[0]}/', client='anon'),
+            Case('recipes list anonymous', 'get', '/api/recipes/',
+                 client='anon'),
+            Case('recipes list', 'get', '/api/recipes/'),
+            Case('recipes list by tags', 'get', f'/api/recipes/?{tag_slugs}'),
+            Case('recipes list by author', 'get',
+                 f'/api/recipes/?author={author.pk}'),
+            Case('recipes list favorited', 'get',
+                 '/api/recipes/?is_favorited=1'),
+            Case('recipes list popular', 'get',
+                 '/api/recipes/?ordering=popular'),
+            Case('recipes list cursor', 'get',
+                 '/api/recipes/?pagination=cursor&count=false'),
+            Case('recipes list deep page', 'get', '/api/recipes/?page=100'),
+            Case('recipes detail', 'get', recipe_url),
+            Case('recipes create', 'post', '/api/recipes/', recipe_data,
+                 status=201),
+            Case('recipes update', 'patch', f'/api/recipes/{own.pk}/',
+                 recipe_data),
+            Case('recipes delete', 'delete', None, status=204,
+                 prepare=new_recipe),
+            Case('recipes favorite', 'post', f'{recipe_url}favorite/',
+                 status=201,
+                 prepare=relation(Favorite, False, user=user, recipe=recipe)),
+            Case('recipes unfavorite', 'delete', f'{recipe_url}favorite/',
+                 status=204,
+                 prepare=relation(Favorite, True, user=user, recipe=recipe)),
+            Case('recipes add to cart', 'post', f'{recipe_url}shopping_cart/',
+                 status=201, prepare=relation(
+                     ShoppingCart, False, user=user, recipe=recipe
+                 )),
+            Case('recipes remove from cart', 'delete',
+                 f'{recipe_url}shopping_cart/', status=204,
+                 prepare=relation(ShoppingCart, True, user=user,
+                                  recipe=recipe)),
+            Case('download shopping cart pdf', 'get',
+                 '/api/recipes/download_shopping_cart/'),
+            Case('download shopping cart txt', 'get',
+                 '/api/recipes/download_shopping_cart/?format=txt'),
+        ]
+
+    def request(self, case):
+        path = case.path
+        if case.prepare:
+            path = case.prepare() or path
+        client = self.clients[case.client]
+        started = time.perf_counter()
+        response = getattr(client, case.method)(
+            path, case.data, format='json'
+        )
+        response.getvalue()
+        duration = (time.perf_counter() - started) * 1000
+        response.close()
+        return path, response.status_code, duration
+
+    def run_cases(self, options):
+        cases = [
+            case for case in self.get_cases()
+            if options['filter'] in case.name
+        ]
+        results = []
+        covered = set()
+        for case in cases:
+            path, status, _ = self.request(case)
+            covered.add(resolve(path.split('?')[0]).url_name)
+            timings = []
+            queries = []
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connection) as context:
+                    _, status, duration = self.request(case)
+                timings.append(duration)
+                queries.append(len(context))
+            tracemalloc.start()
+            try:
+                self.request(case)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            results.append({
+                'name': case.name,
+                'method': case.method.upper(),
+                'path': path,
+                'status': status,
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(
+                    statistics.quantiles(timings, n=20)[-1]
+                    if len(timings) > 1 else timings[0], 3
+                ),
+                'queries': max(queries),
+                'alloc_peak_kb': round(peak / 1024, 1),
+            })
+            if status != case.status:
+                self.stderr.write(
+                    f'{case.name}: ответ {status}, ожидался {case.status}'
+                )
+        if not options['filter']:
+            missing = [
+                name for name in get_routes().values()
+                if name not in covered
+            ]
+            if missing:
+                self.stderr.write(
+                    'Маршруты без сценария: ' + ', '.join(missing)
+                )
+        return results
+
+    def print_report(self, results, baseline):
+        header = (
+            f'{"сценарий":<32}{"статус":>7}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросы":>9}{"память, КБ":>12}'
+        )
+        self.stdout.write(header)
+        for result in results:
+            line = (
+                f'{result["name"]:<32}{result["status"]:>7}'
+                f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["queries"]:>9}{result["alloc_peak_kb"]:>12.1f}'
+            )
+            before = baseline.get(result['name'])
+            if before:
+                line += (
+                    f'  p50 {result["p50_ms"] - before["p50_ms"]:+.2f}'
+                    f' запросы {result["queries"] - before["queries"]:+d}'
+                )
+            self.stdout.write(line)
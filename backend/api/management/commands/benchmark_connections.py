@@ -0,0 +1,109 @@
+import statistics
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from foodgram.db.pool import get_pool_stats
+
+MODES = {
+    'close': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'reuse': {'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': False},
+    'reuse+check': {'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True},
+}
+
+
+class Command(BaseCommand):
+    """Задержка запроса с новым соединением на каждый запрос и без.
+
+    Запросы идут через WSGIHandler, как от gunicorn: в отличие от
+    тестового клиента он закрывает соединения по CONN_MAX_AGE в начале
+    и конце запроса. Режимы: close — соединение закрывается после
+    каждого запроса (с пулом — возвращается в пул), reuse — остаётся
+    открытым, reuse+check — ещё и проверяется перед первым запросом.
+    """
+
+    help = 'Сравнивает задержку запросов с постоянными соединениями и без.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/?limit=1')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument(
+            '--modes', default=','.join(MODES),
+            help='Через запятую: ' + ', '.join(MODES) + '.'
+        )
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Неизвестные режимы: {", ".join(unknown)}')
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory()
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        saved = {key: settings_dict.get(key) for key in MODES['close']}
+        connections.close_all()
+        connection_created.connect(self.count_connection)
+        self.stdout.write(
+            f'{"режим":<14}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"среднее, мс":>13}{"соединений":>12}'
+        )
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for mode in modes:
+                    settings_dict.update(MODES[mode])
+                    timings = self.run_mode(options)
+                    self.stdout.write(
+                        f'{mode:<14}{statistics.median(timings):>10.3f}'
+                        f'{statistics.quantiles(timings, n=20)[-1]:>10.3f}'
+                        f'{statistics.mean(timings):>13.3f}'
+                        f'{self.connects:>12}'
+                    )
+        finally:
+            connection_created.disconnect(self.count_connection)
+            settings_dict.update(saved)
+        for alias, stats in get_pool_stats().items():
+            self.stdout.write(f'пул {alias}: {stats}')
+
+    def count_connection(self, **kwargs):
+        self.connects += 1
+
+    def run_mode(self, options):
+        self.connects = 0
+        timings = []
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(options['iterations']):
+                    environ = self.factory.get(options['path']).environ
+                    started = time.perf_counter()
+                    response = self.handler(environ, self.start_response)
+                    b''.join(response)
+                    response.close()
+                    timings.append((time.perf_counter() - started) * 1000)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(errors[0])
+        return timings
+
+    def start_response(self, status, headers):
+        if not status.startswith('200'):
+            raise CommandError(f'Ответ {status}')
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from api.paginations import RecipePagination
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.management.commands.generate_data import PREFIX
+from recipes.models import Recipe
+from rest_framework.test import APIClient
+
+
+class Command(BaseCommand):
+    """Глубокие страницы ленты: OFFSET против курсора.
+
+    Для каждой страницы из --pages запрашивается лента с page=N и та
+    же страница по курсору, с подсчётом count и без него. Курсор для
+    страницы N строится по последнему рецепту страницы N - 1, чтобы
+    не проходить все предыдущие страницы. Недостающие рецепты
+    дополняются через generate_data с одним ингредиентом и тегом на
+    рецепт: на план ленты они не влияют, а заполнение идёт быстрее.
+    """
+
+    help = 'Сравнивает OFFSET и курсорную пагинацию на глубоких страницах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument(
+            '--pages', type=int, nargs='+', default=[1, 10_000]
+        )
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if Recipe.objects.filter(
+            name__startswith=PREFIX
+        ).count() < options['recipes']:
+            call_command(
+                'generate_data',
+                recipes=options['recipes'],
+                ingredients_per_recipe=1,
+                tags_per_recipe=1,
+                stdout=self.stdout,
+            )
+        if connection.vendor == 'postgresql':
+            # Без свежей статистики после заполнения планировщик
+            # ошибается и на запросах, не связанных с пагинацией.
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.client = APIClient()
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, '
+            f'на странице: {options["limit"]}'
+        )
+        self.stdout.write(
+            f'{"страница":>9}  {"режим":<18}{"p50, мс":>10}'
+            f'{"запросов":>10}'
+        )
+        limit = options['limit']
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for page in options['pages']:
+                cursor = self.get_cursor(page, limit)
+                paths = {
+                    'offset': f'?limit={limit}&page={page}',
+                    'cursor': f'?limit={limit}&pagination=cursor'
+                              f'&cursor={cursor}',
+                    'cursor, count=false': f'?limit={limit}'
+                                           f'&pagination=cursor'
+                                           f'&cursor={cursor}&count=false',
+                }
+                for mode, query in paths.items():
+                    timing, queries = self.measure(
+                        f'/api/recipes/{query}', options['iterations']
+                    )
+                    self.stdout.write(
+                        f'{page:>9}  {mode:<18}{timing:>10.2f}{queries:>10}'
+                    )
+
+    @staticmethod
+    def get_cursor(page, limit):
+        """Курсор, указывающий на начало страницы page."""
+        if page == 1:
+            return ''
+        position = Recipe.objects.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'pk'
+        )[(page - 1) * limit - 1]
+        return RecipePagination.make_cursor(*position)
+
+    def measure(self, path, iterations):
+        timings = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = self.client.get(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path}: {response.status_code}')
+        return statistics.median(timings), len(context)
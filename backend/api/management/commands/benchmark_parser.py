@@ -0,0 +1,91 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from api.parsers import StreamingBase64JSONParser
+from django.core.management import BaseCommand, CommandError
+from foodgram.memory import get_peak_rss
+from rest_framework.parsers import JSONParser
+
+PARSERS = ('json', 'streaming')
+# Кратно трём, чтобы куски base64 склеивались без '='.
+CHUNK_SIZE = 48 * 1024
+
+
+def write_body(path, size):
+    """Тело создания рецепта с картинкой size байт, без неё в памяти."""
+    with open(path, 'wb') as file:
+        file.write(b'{"name": "Benchmark", "text": "Benchmark", '
+                   b'"cooking_time": 10, "tags": [1], '
+                   b'"ingredients": [{"id": 1, "amount": 10}], '
+                   b'"image": "data:image/png;base64,')
+        for start in range(0, size, CHUNK_SIZE):
+            file.write(base64.b64encode(
+                os.urandom(min(CHUNK_SIZE, size - start))
+            ))
+        file.write(b'"}')
+
+
+class Command(BaseCommand):
+    """Пиковая память разбора тела рецепта с большой картинкой.
+
+    Каждый замер идёт в отдельном процессе, потому что пик RSS
+    процесса не сбрасывается. json — прежний путь: JSONParser и
+    декодирование base64 целиком, как в Base64ImageField. streaming —
+    StreamingBase64JSONParser, который пишет картинку во временный
+    файл. Печатается прирост пика RSS при разборе.
+    """
+
+    help = 'Замеряет пиковую память разбора картинок в base64.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 10, 50],
+            help='Размеры картинок в мегабайтах.'
+        )
+        parser.add_argument(
+            '--child', nargs=2, metavar=('PARSER', 'BYTES'),
+            help='Один замер в текущем процессе.'
+        )
+
+    def handle(self, *args, **options):
+        if options['child']:
+            return self.measure(*options['child'])
+        self.stdout.write(
+            f'{"картинка, МБ":>13}{"парсер":>11}'
+            f'{"прирост RSS, МБ":>17}{"время, мс":>11}'
+        )
+        for size in options['sizes']:
+            for name in PARSERS:
+                result = subprocess.run(
+                    (sys.executable, sys.argv[0], 'benchmark_parser',
+                     '--child', name, str(size * 1024 * 1024)),
+                    capture_output=True, text=True
+                )
+                if result.returncode:
+                    raise CommandError(result.stderr)
+                peak, elapsed = json.loads(result.stdout)
+                self.stdout.write(
+                    f'{size:>13}{name:>11}'
+                    f'{peak / 1024:>17.1f}{elapsed:>11.1f}'
+                )
+
+    def measure(self, name, size):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'body.json')
+            write_body(path, int(size))
+            baseline = get_peak_rss()
+            started = time.perf_counter()
+            with open(path, 'rb') as stream:
+                if name == 'json':
+                    data = JSONParser().parse(stream)
+                    base64.b64decode(data['image'].split(',', 1)[1])
+                else:
+                    data = StreamingBase64JSONParser().parse(stream)
+                    data['image'].close()
+            elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(json.dumps((get_peak_rss() - baseline, elapsed)))
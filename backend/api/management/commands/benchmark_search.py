@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+
+from api.search import search_ingredients
+from django.core.management import BaseCommand
+from django.db import connection
+from recipes.management.commands.generate_data import PREFIX, bulk_insert
+from recipes.models import Ingredient
+
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+
+class Command(BaseCommand):
+    """Поиск ингредиентов: прежний istartswith против ранжированного.
+
+    Для каждого запроса печатается медиана времени, число найденных
+    и то, прочитал ли PostgreSQL таблицу целиком (Seq Scan) вместо
+    индекса. --synthetic дополняет справочник случайными названиями,
+    чтобы таблица была больше, чем помещается в один seq scan.
+    """
+
+    help = 'Сравнивает поиск ингредиентов с прежним фильтром.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--terms', nargs='+', default=['сах', 'мол', 'ахар', 'сохар']
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--synthetic', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            self.create_synthetic(options['synthetic'])
+        self.stdout.write(
+            f'{"запрос":<10}{"фильтр":<10}{"p50, мс":>10}'
+            f'{"найдено":>9}  план'
+        )
+        queries = {
+            'старый': lambda value: Ingredient.objects.filter(
+                name__istartswith=value
+            ),
+            'новый': lambda value: search_ingredients(
+                Ingredient.objects.all(), value
+            ),
+        }
+        for value in options['terms']:
+            for name, get_queryset in queries.items():
+                timings = []
+                for _ in range(options['iterations']):
+                    started = time.perf_counter()
+                    found = len(list(get_queryset(value)))
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'{value:<10}{name:<10}'
+                    f'{statistics.median(timings):>10.2f}{found:>9}  '
+                    f'{self.get_plan(get_queryset(value))}'
+                )
+
+    @staticmethod
+    def get_plan(queryset):
+        if connection.vendor != 'postgresql':
+            return '-'
+        plan = queryset.explain()
+        return 'Seq Scan' if 'Seq Scan' in plan else 'индекс'
+
+    def create_synthetic(self, total):
+        rng = random.Random(0)
+        bulk_insert(Ingredient, (
+            {
+                'name': PREFIX + ' '.join(
+                    ''.join(rng.choices(LETTERS, k=rng.randint(4, 9)))
+                    for _ in range(2)
+                ),
+                'measurement_unit': 'г',
+            }
+            for _ in range(total)
+        ))
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE recipes_ingredient')
@@ -0,0 +1,64 @@
+import statistics
+import time
+import tracemalloc
+from tempfile import SpooledTemporaryFile
+
+from api.download_in_pdf import (SPOOL_MAX_SIZE, format_lines, get_cache_key,
+                                 register_font, render_pdf)
+from django.core.management import BaseCommand
+
+
+def get_ingredients(total):
+    for number in range(total):
+        yield {
+            'ingredient__name': f'Ингредиент номер {number}',
+            'ingredient__measurement_unit': 'г',
+            'total_ingredient_amount': number % 1000 + 1,
+        }
+
+
+class Command(BaseCommand):
+    """Время и пиковая память построения PDF списка покупок.
+
+    Для каждого размера списка строится PDF так же, как в
+    download_shopping_cart при промахе кэша, и отдельно считается
+    ключ кэша — единственная работа при попадании.
+    """
+
+    help = 'Замеряет построение PDF списка покупок разного размера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines', type=int, nargs='+', default=[10, 500, 5000]
+        )
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        register_font()
+        self.stdout.write(
+            f'{"строк":>7}{"PDF, КБ":>10}{"p50, мс":>10}'
+            f'{"пик памяти, КБ":>16}{"ключ кэша, мс":>15}'
+        )
+        for total in options['lines']:
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file:
+                    render_pdf(format_lines(get_ingredients(total)), file)
+                    size = file.tell()
+                timings.append((time.perf_counter() - started) * 1000)
+            tracemalloc.start()
+            try:
+                with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file:
+                    render_pdf(format_lines(get_ingredients(total)), file)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            started = time.perf_counter()
+            get_cache_key(format_lines(get_ingredients(total)))
+            key_time = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f'{total:>7}{size / 1024:>10.1f}'
+                f'{statistics.median(timings):>10.2f}'
+                f'{peak / 1024:>16.1f}{key_time:>15.2f}'
+            )
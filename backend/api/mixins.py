@@ -1,6 +1,13 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponse, HttpResponseNotModified
+from recipes.cache import get_version
 from rest_framework.filters import SearchFilter
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.viewsets import GenericViewSet
 
 from .permissions import IsAdminOrReadOnly
@@ -14,3 +21,60 @@ class ModelMixinSet(CreateModelMixin, DestroyModelMixin,
     filter_backends = (SearchFilter,)
     search_fields = ('name',)
     lookup_field = 'slug'
+
+
+class CatalogueCacheMixin:
+    """Отдаёт list и retrieve справочника из памяти процесса.
+
+    Готовый JSON хранится по полному пути запроса вместе с версией
+    справочника и ETag. Версия меняется сигналами при сохранении и
+    удалении объектов cache_model, после чего ответ собирается заново.
+    Словарь общий для потоков процесса, обращения к нему идут под
+    _lock; сам ответ собирается вне блокировки.
+    """
+
+    cache_model = None
+    cache_max_size = 1024
+    _responses = OrderedDict()
+    _lock = threading.Lock()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, view, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return view(request, *args, **kwargs)
+        version = get_version(self.cache_model)
+        key = (self.cache_model, request.get_full_path())
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None and cached[0] == version:
+                self._responses.move_to_end(key)
+        if cached is None or cached[0] != version:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = JSONRenderer().render(response.data)
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            cached = (version, content, etag)
+            with self._lock:
+                self._responses[key] = cached
+                self._responses.move_to_end(key)
+                if len(self._responses) > self.cache_max_size:
+                    self._responses.popitem(last=False)
+        _, content, etag = cached
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type='application/json'
+            )
+        response['ETag'] = etag
+        return response
@@ -1,4 +1,12 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
@@ -6,3 +14,122 @@ class LimitPageNumberPagination(PageNumberPagination):
 
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """Паджинатор ленты рецептов с режимом курсора.
+
+    По умолчанию работает как LimitPageNumberPagination. С параметром
+    pagination=cursor страницы выбираются по ключу (-pub_date, -id)
+    без OFFSET, а с count=false ещё и без подсчёта общего количества.
+    Курсор всегда идёт по дате, параметр ordering в этом режиме
+    не учитывается.
+    """
+
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) != 'false':
+            self.count = queryset.count()
+        position, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by('-pub_date', '-id')
+        if position is not None:
+            pub_date, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            # Отдельное условие на pub_date даёт планировщику диапазон
+            # для индекса, OR уточняет порядок внутри одной даты.
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{lookup}e': pub_date}),
+                Q(**{f'pub_date__{lookup}': pub_date})
+                | Q(**{f'id__{lookup}': pk})
+            )
+        items = list(queryset[:page_size + 1])
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if reverse:
+            items.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.items = items
+        return items
+
+    def get_page_state(self):
+        """Всё, что ответ выводит помимо results: для ETag ленты."""
+        count = self.count if self.use_cursor else self.page.paginator.count
+        return count, self.get_next_link(), self.get_previous_link()
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.items:
+            return None
+        return self.encode_cursor(self.items[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.items:
+            return None
+        return self.encode_cursor(self.items[0], reverse=True)
+
+    @staticmethod
+    def get_position(item):
+        if isinstance(item, dict):
+            return item['pub_date'], item['pk']
+        return item.pub_date, item.pk
+
+    @staticmethod
+    def make_cursor(pub_date, pk, reverse=False):
+        """Значение параметра cursor для позиции (pub_date, pk)."""
+        token = f'{int(reverse)}|{pub_date.isoformat()}|{pk}'
+        return urlsafe_b64encode(token.encode()).decode()
+
+    def encode_cursor(self, item, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.make_cursor(*self.get_position(item), reverse=reverse)
+        )
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            reverse, pub_date, pk = urlsafe_b64decode(
+                token.encode()
+            ).decode().split('|')
+            return (
+                (datetime.fromisoformat(pub_date), int(pk)),
+                bool(int(reverse))
+            )
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
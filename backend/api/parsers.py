@@ -0,0 +1,203 @@
+import base64
+import binascii
+import json
+import re
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+DATA_URI = re.compile(rb'data:([\w.+-]+/[\w.+-]+);base64,')
+HEADER_MAX_LENGTH = 128
+OUTSIDE, STRING, BASE64 = range(3)
+
+
+class Base64Spooler:
+    """Вырезает из потока JSON строки data:...;base64 в файлы.
+
+    JSON читается кусками. Обычные строки копируются как есть, а строки
+    с data URI по мере чтения декодируются во временные файлы и
+    заменяются в тексте на метки, по которым их потом можно найти.
+    В файлы уходят только значения ключей fields верхнего уровня,
+    data URI в остальных полях остаются строками.
+    """
+
+    def __init__(self, fields):
+        self.fields = {field.encode() for field in fields}
+        self.text = bytearray()
+        self.files = {}
+        self.state = OUTSIDE
+        self.escape = False
+        self.depth = 0
+        # Последняя строка и текст после неё: по ним видно, что
+        # следующая строка — значение ключа.
+        self.previous = None
+        self.separator = bytearray()
+
+    def feed(self, chunk):
+        position = 0
+        # Ближайшая кавычка ищется заново, только когда позиция её
+        # прошла: иначе строка с частыми экранированиями сканировала бы
+        # кусок до кавычки на каждом "\".
+        quote = None
+        while position < len(chunk):
+            if self.escape:
+                self.escape = False
+                self.write_escaped(chunk[position:position + 1])
+                position += 1
+            elif self.state == OUTSIDE:
+                end = chunk.find(b'"', position)
+                if end == -1:
+                    self.write_outside(chunk[position:])
+                    return
+                self.write_outside(chunk[position:end])
+                self.start_string()
+                position = end + 1
+            else:
+                if quote is None or -1 < quote < position:
+                    quote = chunk.find(b'"', position)
+                string_end = len(chunk) if quote == -1 else quote
+                end = chunk.find(b'\\', position, string_end)
+                if end == -1:
+                    end = string_end
+                self.write(chunk[position:end])
+                if end == len(chunk):
+                    return
+                position = end + 1
+                if chunk[end:position] == b'\\':
+                    self.escape = True
+                else:
+                    self.end_string()
+
+    def write_outside(self, data):
+        self.text += data
+        self.depth += (
+            data.count(b'{') + data.count(b'[')
+            - data.count(b'}') - data.count(b']')
+        )
+        if self.previous is not None:
+            self.separator += data
+
+    def start_string(self):
+        key = self.previous if self.separator.strip() == b':' else None
+        self.previous = None
+        self.state = STRING
+        self.string = bytearray()
+        # Начало строки без экранирования "\/" для поиска data URI.
+        self.header = bytearray()
+        self.plain = self.depth != 1 or key not in self.fields
+
+    def write_escaped(self, byte):
+        if self.state == BASE64:
+            if byte == b'/':
+                self.write(byte)
+            return
+        unescaped = byte if byte == b'/' else b'\\' + byte
+        self.write(b'\\' + byte, unescaped)
+
+    def write(self, data, unescaped=None):
+        if self.state == BASE64:
+            self.pending += data
+            length = len(self.pending) // 4 * 4
+            if length:
+                self.decode(self.pending[:length])
+                del self.pending[:length]
+            return
+        self.string += data
+        if self.plain:
+            return
+        self.header += data if unescaped is None else unescaped
+        match = DATA_URI.match(self.header)
+        if match:
+            self.start_base64(match)
+        elif (
+            len(self.header) > HEADER_MAX_LENGTH
+            or not b'data:'.startswith(self.header[:5])
+        ):
+            self.plain = True
+
+    def start_base64(self, match):
+        content_type = match.group(1).decode()
+        self.file = TemporaryUploadedFile(
+            f'{uuid4()}.{content_type.split("/")[-1]}',
+            content_type,
+            0,
+            None
+        )
+        self.token = f'base64-upload:{uuid4().hex}'
+        self.files[self.token] = self.file
+        self.state = BASE64
+        self.pending = bytearray()
+        remainder = self.header[match.end():]
+        self.string = self.header = None
+        self.write(remainder)
+
+    def decode(self, data):
+        try:
+            self.file.write(base64.b64decode(bytes(data), validate=True))
+        except binascii.Error as exc:
+            raise ParseError(f'Base64 decode error - {exc}')
+
+    def end_string(self):
+        if self.state == BASE64:
+            if self.pending:
+                padding = -len(self.pending) % 4
+                self.decode(self.pending + b'=' * padding)
+            self.file.size = self.file.tell()
+            self.file.seek(0)
+            self.text += b'"' + self.token.encode() + b'"'
+        else:
+            self.text += b'"' + self.string + b'"'
+            self.previous = bytes(self.string)
+            self.separator = bytearray()
+        self.state = OUTSIDE
+
+    def close_files(self):
+        for file in self.files.values():
+            file.close()
+
+
+def replace_uploads(data, files):
+    if isinstance(data, dict):
+        return {
+            key: replace_uploads(value, files) for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [replace_uploads(value, files) for value in data]
+    if isinstance(data, str) and data in files:
+        return files[data]
+    return data
+
+
+class StreamingBase64JSONParser(JSONParser):
+    """JSON-парсер для рецептов с большими картинками в base64.
+
+    В отличие от JSONParser не держит в памяти ни тело запроса целиком,
+    ни декодированную картинку: она пишется во временный файл, а в
+    данных оказывается сам файл, который принимает HybridImageField.
+    """
+
+    chunk_size = 64 * 1024
+    # Поля верхнего уровня, которые пишутся во временные файлы.
+    base64_fields = ('image',)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        spooler = Base64Spooler(self.base64_fields)
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                spooler.feed(chunk)
+            data = json.loads(bytes(spooler.text).decode(encoding))
+        except ValueError as exc:
+            spooler.close_files()
+            raise ParseError(f'JSON parse error - {exc}')
+        except ParseError:
+            spooler.close_files()
+            raise
+        return replace_uploads(data, spooler.files)
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+DRF_DIR = os.path.dirname(sys.modules['rest_framework'].__file__)
+IN_LIST = re.compile(r'\(%s(?:, %s)+\)')
+
+
+def get_template(sql):
+    """Шаблон запроса: параметры уже вынесены, схлопываем списки IN."""
+    return IN_LIST.sub('(...)', sql)
+
+
+def get_serializer_origin():
+    """Поле сериализатора, из-за которого выполняется запрос.
+
+    Ищет ближайший кадр стека, где self — сериализатор: либо метод
+    самого сериализатора (get_is_favorited), либо цикл по полям
+    в to_representation из DRF.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, BaseSerializer):
+            name = type(instance).__name__
+            if not frame.f_code.co_filename.startswith(DRF_DIR):
+                return f'{name}.{frame.f_code.co_name}'
+            field = frame.f_locals.get('field')
+            if frame.f_code.co_name == 'to_representation' and field:
+                return f'{name}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryProfile:
+    """Запросы к БД, выполненные за время запроса к API."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.templates = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            template = get_template(sql)
+            self.templates[template] += 1
+            origin = get_serializer_origin()
+            if origin:
+                self.origins[template][origin] += 1
+
+    def get_repeated(self, threshold):
+        return [
+            {
+                'sql': template,
+                'count': count,
+                'origins': dict(self.origins[template]),
+            }
+            for template, count in self.templates.most_common()
+            if count >= threshold
+        ]
+
+
+class QueryProfilerMiddleware:
+    """Считает запросы к БД и их время для каждого запроса к API.
+
+    Включается настройкой QUERY_PROFILER. Итог отдаётся в заголовке
+    Server-Timing и пишется в лог api.profiling одной JSON-строкой;
+    повторяющиеся шаблоны запросов вместе с полями сериализаторов,
+    которые их вызвали, пишутся с уровнем WARNING.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(
+            settings, 'QUERY_PROFILER_REPEAT_THRESHOLD', 2
+        )
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total = (time.perf_counter() - started) * 1000
+        db_time = profile.duration * 1000
+        timing = (
+            f'db;dur={db_time:.2f};desc="{profile.count} queries", '
+            f'total;dur={total:.2f}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        repeated = profile.get_repeated(self.threshold)
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'queries': profile.count,
+                'db_ms': round(db_time, 2),
+                'total_ms': round(total, 2),
+                'repeated': repeated,
+            }, ensure_ascii=False)
+        )
+        return response
+
+
+@contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS):
+    """Проверка в тестах, что блок укладывается в max_queries запросов.
+
+        with query_budget(6):
+            client.get('/api/recipes/')
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > max_queries:
+        queries = Counter(
+            query['sql'] for query in context.captured_queries
+        )
+        details = '\n'.join(
+            f'{count}x {sql}' for sql, count in queries.most_common()
+        )
+        raise AssertionError(
+            f'Выполнено {len(context)} запросов, '
+            f'допустимо {max_queries}:\n{details}'
+        )
@@ -0,0 +1,86 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+from .download_in_pdf import FILE_NAME, TITLE, format_line
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Текстовые форматы отдают список потоком через свой stream(), PDF
+    строится в create_pdf_file. render() нужен DRF только для ответов
+    с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def get_filename(self):
+        return FILE_NAME.replace('.pdf', f'.{self.format}')
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF рендерится целиком в create_pdf_file."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{TITLE}\n'
+        for number, ingredient in enumerate(ingredients, start=1):
+            yield f'{format_line(number, ingredient)}\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['total_ingredient_amount'],
+            ))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        yield '['
+        for number, ingredient in enumerate(ingredients):
+            item = json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient[
+                    'ingredient__measurement_unit'
+                ],
+                'amount': ingredient['total_ingredient_amount'],
+            }, ensure_ascii=False)
+            yield f',{item}' if number else item
+        yield ']'
@@ -0,0 +1,103 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_COOKIE = 'use_primary_db'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+class ReplicaRouter:
+    """Отправляет чтение на реплики, если запрос разрешил это.
+
+    Разрешение выдаёт ReplicaMiddleware только безопасным запросам
+    к API, всё остальное — запись, админка, команды, фоновые
+    потоки — работает с основной базой.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in get_replicas()
+
+
+class ReplicaMiddleware:
+    """Читает из реплик для GET/HEAD/OPTIONS к вьюсетам api.
+
+    После успешной записи клиент на DATABASE_REPLICA_STICKY_SECONDS
+    остаётся на основной базе, чтобы сразу видеть свои изменения,
+    пока реплика догоняет. Признак хранится в cookie для браузера
+    и по токену в кэше default для остальных клиентов: кэш общий для
+    всех процессов, поэтому следующий запрос может попасть в любой
+    воркер.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and get_replicas()
+        ):
+            self.stick_to_primary(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', None)
+        _use_replica.set(
+            request.method in SAFE_METHODS
+            and view is not None
+            and view.__module__.startswith('api.')
+            and not self.is_sticky(request)
+        )
+
+    @staticmethod
+    def get_sticky_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'use_primary_db:{digest}'
+
+    def is_sticky(self, request):
+        if STICKY_COOKIE in request.COOKIES:
+            return True
+        key = self.get_sticky_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def stick_to_primary(self, request, response):
+        timeout = settings.DATABASE_REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=timeout, httponly=True,
+            samesite='Lax'
+        )
+        key = self.get_sticky_key(request)
+        if key is not None:
+            cache.set(key, True, timeout)
@@ -0,0 +1,102 @@
+import re
+from bisect import bisect_left
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from recipes.cache import get_version
+from recipes.models import Ingredient
+
+# Порог похожести, как у pg_trgm по умолчанию.
+SIMILARITY_THRESHOLD = 0.3
+PREFIX, CONTAINS, FUZZY = range(3)
+
+
+def get_trigrams(value):
+    """Триграммы строки по тем же правилам, что и в pg_trgm."""
+    trigrams = set()
+    for word in re.findall(r'\w+', value.lower()):
+        word = f'  {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Используется вместо pg_trgm на остальных СУБД: поиск по префиксу
+    идёт бинарным поиском по отсортированным названиям, вхождения и
+    опечатки ищутся перебором, которого для каталога в пару тысяч
+    ингредиентов хватает с запасом.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            (name.lower(), pk) for pk, name in ingredients
+        )
+        self.names = [name for name, _ in self.entries]
+        self.trigrams = [get_trigrams(name) for name in self.names]
+
+    def search(self, value):
+        """Id ингредиентов: сначала по префиксу, затем вхождения и опечатки."""
+        value = value.lower()
+        start = bisect_left(self.names, value)
+        prefix = []
+        for name, pk in self.entries[start:]:
+            if not name.startswith(value):
+                break
+            prefix.append(pk)
+        found = set(prefix)
+        contains = [
+            pk for name, pk in self.entries
+            if pk not in found and value in name
+        ]
+        found.update(contains)
+        value_trigrams = get_trigrams(value)
+        fuzzy = []
+        for (_, pk), trigrams in zip(self.entries, self.trigrams):
+            if pk in found or not trigrams:
+                continue
+            similarity = (
+                len(value_trigrams & trigrams)
+                / len(value_trigrams | trigrams)
+            )
+            if similarity > SIMILARITY_THRESHOLD:
+                fuzzy.append((-similarity, pk))
+        return prefix + contains + [pk for _, pk in sorted(fuzzy)]
+
+
+_index = None
+
+
+def get_ingredient_index():
+    """Индекс, пересобранный после изменения справочника ингредиентов."""
+    global _index
+    version = get_version(Ingredient)
+    if _index is None or _index.version != version:
+        _index = IngredientIndex(
+            Ingredient.objects.values_list('pk', 'name')
+        )
+        _index.version = version
+    return _index
+
+
+def search_ingredients(queryset, value):
+    """Ранжированный поиск: префикс, затем вхождение, затем опечатки."""
+    if connection.vendor == 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=value) | Q(name__trigram_similar=value)
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=PREFIX),
+                When(name__icontains=value, then=CONTAINS),
+                default=FUZZY,
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramSimilarity('name', value),
+        ).order_by('rank', '-similarity', 'name')
+    ids = get_ingredient_index().search(value)
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
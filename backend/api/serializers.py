@@ -1,12 +1,13 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from django.core.files.storage import default_storage
+from django.db import transaction
+from drf_extra_fields.fields import HybridImageField
+from recipes.images import schedule_image_processing
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, Tag)
 from rest_framework.serializers import (IntegerField, ModelSerializer,
                                         PrimaryKeyRelatedField, ReadOnlyField,
                                         SerializerMethodField, ValidationError)
-from rest_framework.validators import UniqueTogetherValidator
-from users.models import Follow, User
+from users.models import User
 
 from .validators import ValidateColor, ValidateUsername
 
@@ -27,10 +28,11 @@ class UserSerializer(ValidateUsername, ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        user = self.context.get('request').user
         if not request or request.user.is_anonymous:
             return False
-        return obj.following.filter(user=user, author=obj).exists()
+        if hasattr(obj, 'viewer_follows'):
+            return bool(obj.viewer_follows)
+        return obj.following.filter(user=request.user).exists()
 
 
 class UserCreateSerializer(ValidateUsername, ModelSerializer):
@@ -95,7 +97,27 @@ class GetRecipeIngredientSerializer(ModelSerializer):
         )
 
 
-class RecipeSerializer(ModelSerializer):
+class ImageVariantsMixin:
+    """Ссылки на уменьшенные копии картинки рецепта.
+
+    Пока копии не готовы, отдаётся пустой словарь и клиент
+    использует оригинал из поля image.
+    """
+
+    def get_image_variants(self, object):
+        request = self.context.get('request')
+        variants = {}
+        for variant, paths in object.image_variants.items():
+            variants[variant] = {}
+            for extension, path in paths.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[variant][extension] = url
+        return variants
+
+
+class RecipeSerializer(ImageVariantsMixin, ModelSerializer):
     """Сериализатор для безопасного доступа к модели Recipe."""
 
     tags = TagSerializer(many=True, read_only=True)
@@ -107,6 +129,7 @@ class RecipeSerializer(ModelSerializer):
     )
     is_in_shopping_cart = SerializerMethodField(read_only=True)
     is_favorited = SerializerMethodField(read_only=True)
+    image_variants = SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -114,28 +137,34 @@ class RecipeSerializer(ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'image_variants', 'text', 'cooking_time',
         )
 
     def get_is_favorited(self, object):
+        if hasattr(object, 'is_favorited'):
+            return object.is_favorited
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
         return request.user.favorites.filter(recipe=object).exists()
 
     def get_is_in_shopping_cart(self, object):
+        if hasattr(object, 'is_in_shopping_cart'):
+            return object.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
         return request.user.shopping_cart.filter(recipe=object).exists()
 
 
-class ShortRecipeResponseSerializer(ModelSerializer):
+class ShortRecipeResponseSerializer(ImageVariantsMixin, ModelSerializer):
     """Короткий отображение рецептов при создании подписки."""
 
+    image_variants = SerializerMethodField(read_only=True)
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('__all__',)
 
 
@@ -155,7 +184,7 @@ class FollowListSerializer(UserSerializer):
         read_only_fields = ('__all__',)
 
     def get_recipes_count(self, object):
-        return object.recipes.count()
+        return object.recipes_count
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
@@ -165,37 +194,6 @@ class FollowListSerializer(UserSerializer):
         return obj.following.filter(user=user, author=obj).exists()
 
 
-class FollowSerializer(ModelSerializer):
-    """Сериализатор для модели Follow."""
-
-    def validate_author(self, user):
-        author = self.context.get('request').user
-        if user == author:
-            raise ValidationError(
-                'Нельзя подписаться на самого себя.'
-            )
-        return user
-
-    class Meta:
-        model = Follow
-        fields = ('user', 'author')
-        read_only_fields = ('__all__',)
-
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author'),
-                message='Вы уже подписаны.'
-            )
-        ]
-
-    def to_representation(self, instance):
-        return FollowListSerializer(
-            instance.author,
-            context={'request': self.context.get('request')}
-        ).data
-
-
 class CreateRecipeIngredientSerializer(ModelSerializer):
     """Сериализатор для ингредиентов при создании рецепта."""
 
@@ -214,16 +212,18 @@ class CreateRecipeSerializer(ModelSerializer):
     """Сериализатор для небезопасного доступа к модели Recipe."""
 
     author = UserSerializer(read_only=True)
-    image = Base64ImageField(required=False, allow_null=True)
+    image = HybridImageField(required=False, allow_null=True)
     tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
     ingredients = CreateRecipeIngredientSerializer(many=True)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_details(request.user).get(
+            pk=instance.pk
+        )
         return RecipeSerializer(
             instance,
-            context={
-                'request': self.context.get('request')
-            }
+            context={'request': request}
         ).data
 
     def validate(self, data):
@@ -236,6 +236,14 @@ class CreateRecipeSerializer(ModelSerializer):
             raise ValidationError(
                 'Ингредиенты рецепта не должны повторятся.'
             )
+        missing = set(ingredients_data) - set(
+            Ingredient.objects.in_bulk(ingredients_data)
+        )
+        if missing:
+            raise ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.'
+            )
         for ingredient in ingredients:
             if ingredient.get('amount') < 1:
                 raise ValidationError(
@@ -248,16 +256,16 @@ class CreateRecipeSerializer(ModelSerializer):
         return data
 
     def add_ingredients(self, recipe, ingredients_data):
+        # Существование ингредиентов уже проверено в validate().
         RecipeIngredient.objects.bulk_create(
             [RecipeIngredient(
-                ingredient=get_object_or_404(
-                    Ingredient,
-                    id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients_data]
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         author = self.context.get('request').user
@@ -271,17 +279,68 @@ class CreateRecipeSerializer(ModelSerializer):
         )
         recipe.tags.set(tags_data)
         self.add_ingredients(recipe, ingredients_data)
+        self.close_upload(image)
+        schedule_image_processing(recipe)
         return recipe
 
+    @staticmethod
+    def close_upload(image):
+        """Закрывает временный файл картинки, уже перенесённый в MEDIA."""
+        if image is not None:
+            image.close()
+
+    def update_ingredients(self, recipe, stored, ingredients_data):
+        """Приводит ингредиенты рецепта к новым, меняя только разницу."""
+        submitted = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        removed = stored.keys() - submitted.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in submitted.items():
+            row = stored.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.add_ingredients(recipe, [
+            ingredient for ingredient in ingredients_data
+            if ingredient['id'] not in stored
+        ])
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        stored = {
+            row.ingredient_id: row
+            for row in instance.recipe_ingredients.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in stored.items()
+        }
         super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
+        if 'image' in validated_data:
+            self.close_upload(validated_data['image'])
+            schedule_image_processing(instance)
         instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.add_ingredients(instance, ingredients)
+        self.update_ingredients(instance, stored, ingredients)
+        deltas = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        for ingredient_id, amount in old_amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        ShoppingCartIngredient.objects.apply_deltas(
+            instance.shopping_cart.values_list('user_id', flat=True),
+            deltas
+        )
         return instance
 
     class Meta:
@@ -295,38 +354,6 @@ class CreateRecipeSerializer(ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class FavoriteSerializer(ModelSerializer):
-    """Сериализатор для модели Favorite."""
-
-    class Meta:
-        model = Favorite
-        fields = '__all__'
-        read_only_fields = ('__all__',)
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Вы уже добавляли это рецепт в избранное.'
-            )
-        ]
-
-
-class ShoppingCartSerializer(ModelSerializer):
-    """Сериализатор для модели ShoppingCart."""
-
-    class Meta:
-        model = ShoppingCart
-        fields = '__all__'
-        read_only_fields = ('__all__',)
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Этот рецепт уже в списке покупок.'
-            )
-        ]
-
-
 class SubscriptionShowSerializer(UserSerializer):
     recipes = SerializerMethodField()
     recipes_count = SerializerMethodField()
@@ -342,13 +369,14 @@ class SubscriptionShowSerializer(UserSerializer):
         read_only_fields = ('__all__',)
 
     def get_recipes(self, object):
-        recipes_limit = self.context.get('recipes_limit')
-        if recipes_limit:
-            recipes_limit = int(recipes_limit)
-        author_recipes = object.recipes.all()[:recipes_limit]
         return ShortRecipeResponseSerializer(
-            author_recipes, many=True
+            object.limited_recipes, many=True
         ).data
 
     def get_recipes_count(self, object):
-        return object.recipes.count()
+        return object.recipes_count
+
+    def get_is_subscribed(self, obj):
+        # В выдачу подписок попадают только авторы, на которых подписан
+        # пользователь.
+        return True
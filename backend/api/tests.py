@@ -0,0 +1,841 @@
+import base64
+import json
+import re
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+from .filters import RecipeFilter
+from .mixins import CatalogueCacheMixin
+from .parsers import StreamingBase64JSONParser
+from .profiling import query_budget
+from .search import IngredientIndex
+
+WRITE_RE = re.compile(
+    r'(INSERT|UPDATE|DELETE)(?: OR IGNORE)?(?: INTO| FROM)? "(\w+)"'
+)
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class RecipeAPITestCase(TestCase):
+    """Общие данные: авторы, теги, ингредиенты и лента рецептов."""
+
+    recipes_count = 60
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root, IMAGE_PROCESSING_ASYNC=False
+        )
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='viewer', email='viewer@example.com'
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@example.com'
+            )
+            for number in range(3)
+        ]
+        Follow.objects.create(user=cls.user, author=cls.authors[0])
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}', color='#000000'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(40)
+        ]
+        for number in range(cls.recipes_count):
+            recipe = cls.create_recipe(
+                cls.authors[number % len(cls.authors)],
+                cls.ingredients[number % 30:number % 30 + 3],
+                name=f'Рецепт {number}',
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.recipe = Recipe.objects.order_by('pk').first()
+
+    @classmethod
+    def create_recipe(cls, author, ingredients, **fields):
+        recipe = Recipe.objects.create(
+            author=author,
+            image='recipe_images/test.png',
+            cooking_time=10,
+            text='Описание',
+            **fields
+        )
+        recipe.tags.set(cls.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, ingredients, **fields):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': get_image(),
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in ingredients
+            ],
+            **fields
+        }
+
+    def count_queries(self, budget, method, path, **kwargs):
+        """Запрос к API в пределах budget запросов к БД."""
+        with query_budget(budget) as context:
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return response, len(context)
+
+
+class RecipeListQueriesTest(RecipeAPITestCase):
+    """Число запросов ленты не зависит от размера страницы."""
+
+    def test_list_queries_constant(self):
+        _, small = self.count_queries(6, 'get', '/api/recipes/?limit=6')
+        response, large = self.count_queries(
+            6, 'get', '/api/recipes/?limit=50'
+        )
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_list_flags(self):
+        response, _ = self.count_queries(
+            6, 'get', '/api/recipes/?limit=50'
+        )
+        favorited = set(
+            Favorite.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )
+        )
+        for recipe in response.data['results']:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in favorited
+            )
+
+    def test_anonymous_list_queries_constant(self):
+        self.client.force_authenticate(None)
+        _, small = self.count_queries(5, 'get', '/api/recipes/?limit=6')
+        _, large = self.count_queries(5, 'get', '/api/recipes/?limit=50')
+        self.assertEqual(small, large)
+
+
+class RecipeDetailsQueriesTest(RecipeAPITestCase):
+    """Рецепт отдаётся фиксированным числом запросов при любом составе."""
+
+    def test_retrieve_queries_constant(self):
+        small = self.create_recipe(
+            self.authors[1], self.ingredients[:1], name='Малый'
+        )
+        large = self.create_recipe(
+            self.authors[1], self.ingredients[:30], name='Большой'
+        )
+        _, small_count = self.count_queries(
+            5, 'get', f'/api/recipes/{small.pk}/'
+        )
+        response, large_count = self.count_queries(
+            5, 'get', f'/api/recipes/{large.pk}/'
+        )
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data['ingredients']), 30)
+
+    def test_create_response_queries_constant(self):
+        self.client.force_authenticate(self.authors[1])
+        counts = set()
+        for total in (1, 10, 30):
+            with self.subTest(ingredients=total):
+                response, count = self.count_queries(
+                    14, 'post', '/api/recipes/', format='json',
+                    data=self.get_payload(
+                        self.ingredients[:total], name=f'Рецепт {total}'
+                    )
+                )
+                self.assertEqual(len(response.data['ingredients']), total)
+                counts.add(count)
+        self.assertEqual(len(counts), 1)
+
+    def test_update_queries_by_ingredients(self):
+        """Замена трёх ингредиентов на 1, 10 и 30 новых."""
+        self.client.force_authenticate(self.authors[1])
+        counts = set()
+        for total in (1, 10, 30):
+            recipe = self.create_recipe(
+                self.authors[1], self.ingredients[:3], name=f'Рецепт {total}'
+            )
+            ingredients = self.ingredients[10:10 + total]
+            with self.subTest(ingredients=total):
+                response, count = self.count_queries(
+                    18, 'patch', f'/api/recipes/{recipe.pk}/',
+                    format='json', data=self.get_payload(ingredients)
+                )
+                self.assertEqual(len(response.data['ingredients']), total)
+                counts.add(count)
+        self.assertEqual(len(counts), 1)
+
+    def test_update_response_queries_constant(self):
+        self.client.force_authenticate(self.recipe.author)
+        counts = []
+        for ingredients in (self.ingredients[:30], self.ingredients[5:35]):
+            response, count = self.count_queries(
+                18, 'patch', f'/api/recipes/{self.recipe.pk}/',
+                format='json', data=self.get_payload(ingredients)
+            )
+            self.assertEqual(
+                [item['id'] for item in response.data['ingredients']],
+                [ingredient.pk for ingredient in ingredients]
+            )
+            counts.append(count)
+        self.assertEqual(counts[0], counts[1])
+
+
+class RecipeTagFilterTest(RecipeAPITestCase):
+    """Слаги тегов проверяются и переводятся по одному словарю."""
+
+    def test_new_tag_slug(self):
+        self.client.get('/api/recipes/?tags=tag0')
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(
+                name='Бранч', slug='brunch', color='#111111'
+            )
+        self.recipe.tags.add(tag)
+        response = self.client.get('/api/recipes/?tags=brunch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe.pk]
+        )
+
+    def test_tag_ids_resolved_once(self):
+        tag_ids = {tag.slug: tag.pk for tag in self.tags}
+        with mock.patch(
+            'api.filters.get_tag_ids', side_effect=[tag_ids, {}]
+        ) as get_tag_ids:
+            response = self.client.get('/api/recipes/?tags=tag2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(get_tag_ids.call_count, 1)
+
+
+class ReplicaRoutingTest(TestCase):
+    """Чтение идёт на реплику, после записи — на основную базу.
+
+    Реплика — вторая тестовая база той же СУБД. Рецепт есть только
+    в основной, поэтому по числу рецептов в ленте видно, из какой
+    базы она прочитана.
+    """
+
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections.databases[DEFAULT_DB_ALIAS]
+        connections.databases['replica'] = {
+            **default,
+            'NAME': f'{default["NAME"]}_replica',
+            'TEST': {**default['TEST'], 'NAME': None},
+        }
+        cls.replica_name = connections['replica'].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        cls.replicas_override = override_settings(
+            DATABASE_REPLICAS=['replica']
+        )
+        cls.replicas_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.replicas_override.disable()
+        connections['replica'].creation.destroy_test_db(
+            cls.replica_name, verbosity=0
+        )
+        del connections['replica']
+        del connections.databases['replica']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        # Пользователь и токен уже доехали до реплики, рецепт — ещё нет.
+        cls.user.save(using='replica')
+        cls.token.save(using='replica')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            image='recipe_images/test.png',
+            cooking_time=10,
+            text='Описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_count(self, client):
+        response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['count']
+
+    def test_read_from_replica(self):
+        self.assertEqual(self.get_count(self.client), 0)
+
+    def test_read_own_write_from_primary(self):
+        response = self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_count(self.client), 1)
+        # Без cookie признак находится по токену в общем кэше.
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.get_count(client), 1)
+
+
+class RecipeConditionalTest(RecipeAPITestCase):
+    """ETag учитывает всё, что выводится, а 304 не сериализует рецепты."""
+
+    def get_etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertModified(self, path, etag, modified=True):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200 if modified else 304)
+
+    def test_not_modified_skips_serializer(self):
+        for path in ('/api/recipes/?limit=50',
+                     f'/api/recipes/{self.recipe.pk}/'):
+            etag = self.get_etag(path)
+            with mock.patch(
+                'api.serializers.RecipeSerializer.to_representation'
+            ) as to_representation:
+                response, _ = self.count_queries(
+                    2, 'get', path, HTTP_IF_NONE_MATCH=etag
+                )
+            self.assertEqual(response.status_code, 304)
+            to_representation.assert_not_called()
+
+    def test_author_rename(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.get_etag(path)
+        self.assertModified(path, etag, modified=False)
+        User.objects.filter(pk=self.recipe.author_id).update(
+            first_name='Новое имя'
+        )
+        self.assertModified(path, etag)
+
+    def test_catalogue_rename(self):
+        path = '/api/recipes/?limit=6'
+        for item in (self.tags[0], self.ingredients[0]):
+            etag = self.get_etag(path)
+            item.name = f'{item.name} (новое)'
+            with self.captureOnCommitCallbacks(execute=True):
+                item.save()
+            self.assertModified(path, etag)
+
+    def test_other_page_changes(self):
+        paths = (
+            '/api/recipes/?limit=3',
+            '/api/recipes/?limit=3&pagination=cursor',
+        )
+        etags = [self.get_etag(path) for path in paths]
+        Recipe.objects.order_by('pub_date', 'pk').first().delete()
+        for path, etag in zip(paths, etags):
+            with self.subTest(path=path):
+                self.assertModified(path, etag)
+
+
+class RecipeWritesTest(RecipeAPITestCase):
+    """Правка рецепта пишет в БД только то, что изменилось."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.recipe.author)
+        self.ingredients_payload = [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in self.recipe.recipe_ingredients.order_by('pk')
+        ]
+
+    def count_writes(self, ingredients, tags=None):
+        """Число INSERT/UPDATE/DELETE по таблицам при PATCH рецепта."""
+        payload = {
+            'ingredients': ingredients,
+            'tags': [tag.pk for tag in tags or self.tags[:2]],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        writes = Counter()
+        for query in context.captured_queries:
+            match = WRITE_RE.match(query['sql'])
+            if match:
+                writes[f'{match[1]} {match[2]}'] += 1
+        return dict(writes)
+
+    def get_ingredients(self, ingredients, amount=3):
+        return [
+            {'id': ingredient.pk, 'amount': amount}
+            for ingredient in ingredients
+        ]
+
+    def test_unchanged(self):
+        self.assertEqual(
+            self.count_writes(self.ingredients_payload),
+            {'UPDATE recipes_recipe': 1}
+        )
+
+    def test_change_amount(self):
+        first, *rest = self.ingredients_payload
+        self.assertEqual(
+            self.count_writes([{**first, 'amount': 99}, *rest]),
+            {'UPDATE recipes_recipe': 1, 'UPDATE recipes_recipeingredient': 1}
+        )
+
+    def test_add_and_remove_ingredient(self):
+        self.assertEqual(
+            self.count_writes(
+                self.ingredients_payload[1:]
+                + self.get_ingredients(self.ingredients[39:])
+            ),
+            {
+                'UPDATE recipes_recipe': 1,
+                'DELETE recipes_recipeingredient': 1,
+                'INSERT recipes_recipeingredient': 1,
+            }
+        )
+
+    def test_change_tags(self):
+        self.assertEqual(
+            self.count_writes(self.ingredients_payload, self.tags[1:]),
+            {
+                'UPDATE recipes_recipe': 1,
+                'DELETE recipes_recipe_tags': 1,
+                'INSERT recipes_recipe_tags': 1,
+            }
+        )
+
+    def test_replace_ingredients_constant(self):
+        expected = {
+            'UPDATE recipes_recipe': 1,
+            'DELETE recipes_recipeingredient': 1,
+            'INSERT recipes_recipeingredient': 1,
+        }
+        for ingredients in (self.ingredients[10:40], self.ingredients[:30]):
+            self.assertEqual(
+                self.count_writes(self.get_ingredients(ingredients)),
+                expected
+            )
+
+    def test_shopping_cart_totals(self):
+        for user in (self.user, self.authors[2]):
+            ShoppingCart.objects.add(user=user, recipe=self.recipe)
+        self.assertEqual(
+            self.count_writes(self.ingredients_payload),
+            {'UPDATE recipes_recipe': 1}
+        )
+        self.assertEqual(
+            self.count_writes(self.get_ingredients(self.ingredients[10:40])),
+            {
+                'UPDATE recipes_recipe': 1,
+                'DELETE recipes_recipeingredient': 1,
+                'INSERT recipes_recipeingredient': 1,
+                'INSERT recipes_shoppingcartingredient': 1,
+                'UPDATE recipes_shoppingcartingredient': 1,
+                'DELETE recipes_shoppingcartingredient': 1,
+            }
+        )
+
+
+class RecipeAuthorFilterTest(TestCase):
+    """?author= сравнивает id точно и идёт по индексу автора."""
+
+    author_ids = (1, 10, 11, 21)
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_id in cls.author_ids:
+            author = User.objects.create(
+                pk=author_id,
+                username=f'author{author_id}',
+                email=f'author{author_id}@example.com'
+            )
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт автора {author_id}',
+                image='recipe_images/test.png',
+                cooking_time=10,
+                text='Описание',
+            )
+
+    def get_authors(self, value):
+        response = self.client.get(f'/api/recipes/?author={value}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(
+            recipe['author']['id'] for recipe in response.data['results']
+        )
+
+    def test_exact_match(self):
+        self.assertEqual(self.get_authors('1'), [1])
+        self.assertEqual(self.get_authors('1,21'), [1, 21])
+        self.assertEqual(self.get_authors('2'), [])
+
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'Нужен EXPLAIN PostgreSQL.'
+    )
+    def test_author_index(self):
+        queryset = RecipeFilter(
+            data={'author': '1,21'}, queryset=Recipe.objects.all()
+        ).qs
+        with connection.cursor() as cursor:
+            # На нескольких строках seq scan дешевле любого индекса.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn('recipe_author_pub_date_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+
+class StreamingBase64JSONParserTest(TestCase):
+    """В файл уходит только картинка, остальные data URI — строки."""
+
+    def parse(self, data, chunk_size=None):
+        parser = StreamingBase64JSONParser()
+        if chunk_size:
+            parser.chunk_size = chunk_size
+        return parser.parse(BytesIO(json.dumps(data).encode()))
+
+    def test_only_image_spooled(self):
+        image = get_image()
+        for chunk_size in (None, 7):
+            with self.subTest(chunk_size=chunk_size):
+                data = self.parse({
+                    'text': image,
+                    'ingredients': [{'image': image}],
+                    'image': image,
+                    'name': 'image',
+                    'note': 'Кавычки "", слэши \\ / и\nперенос',
+                }, chunk_size)
+                self.assertEqual(data['text'], image)
+                self.assertEqual(data['ingredients'], [{'image': image}])
+                self.assertEqual(data['name'], 'image')
+                self.assertEqual(
+                    data['note'], 'Кавычки "", слэши \\ / и\nперенос'
+                )
+                self.assertEqual(
+                    data['image'].read(),
+                    base64.b64decode(image.split(',', 1)[1])
+                )
+                data['image'].close()
+
+
+class CatalogueCacheTest(TestCase):
+    """Справочник отдаётся из памяти, пока его версия не сменилась."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#000000'
+        )
+
+    def setUp(self):
+        CatalogueCacheMixin._responses.clear()
+
+    def get(self, path, queries, **headers):
+        with self.assertNumQueries(queries):
+            return self.client.get(path, **headers)
+
+    def test_cache_hit(self):
+        for path in ('/api/tags/', f'/api/tags/{self.tag.pk}/'):
+            first = self.get(path, 1)
+            second = self.get(path, 0)
+            self.assertEqual(second.status_code, 200)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_not_modified(self):
+        etag = self.get('/api/tags/', 1)['ETag']
+        response = self.get('/api/tags/', 0, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_rebuild_after_save(self):
+        etag = self.get('/api/tags/', 1)['ETag']
+        self.tag.name = 'Обед'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.save()
+        response = self.get('/api/tags/', 1, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Обед')
+
+
+class RecipeCursorPaginationTest(RecipeAPITestCase):
+    """Курсор проходит ленту в порядке (-pub_date, -id) в обе стороны."""
+
+    path = '/api/recipes/?pagination=cursor&limit=7'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Одинаковая дата у части рецептов: порядок решает id.
+        Recipe.objects.filter(
+            pk__in=Recipe.objects.order_by('pk').values('pk')[10:20]
+        ).update(pub_date=Recipe.objects.get(pk=cls.recipe.pk).pub_date)
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_walk_forward_and_back(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', flat=True))
+        pages = []
+        url = self.path
+        while url:
+            page = self.get_page(url)
+            pages.append([recipe['id'] for recipe in page['results']])
+            url = page['next']
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(len(pages), -(-len(expected) // 7))
+        back = [pages[-1]]
+        url = page['previous']
+        while url:
+            page = self.get_page(url)
+            back.append([recipe['id'] for recipe in page['results']])
+            url = page['previous']
+        self.assertEqual(back[::-1], pages)
+        self.assertIsNotNone(page['next'])
+
+    def test_count(self):
+        self.assertEqual(self.get_page(self.path)['count'], self.recipes_count)
+        page = self.get_page(f'{self.path}&count=false')
+        self.assertNotIn('count', page)
+        self.assertEqual(len(page['results']), 7)
+
+    def test_malformed_cursor(self):
+        for cursor in (
+            'not-base64!',
+            *(
+                base64.urlsafe_b64encode(token).decode()
+                for token in (b'0|x|1', b'0|2020-01-01T00:00:00|x', b'0|1')
+            ),
+        ):
+            response = self.client.get(f'{self.path}&cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+
+class SubscriptionsTest(RecipeAPITestCase):
+    """Подписки: последние recipes_limit рецептов без запроса на автора."""
+
+    path = '/api/users/subscriptions/'
+
+    def get_subscriptions(self, query=''):
+        response = self.client.get(f'{self.path}{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['results']
+
+    def test_queries_constant(self):
+        for authors in (self.authors[:1], self.authors):
+            for author in authors:
+                Follow.objects.get_or_create(user=self.user, author=author)
+            with self.subTest(authors=len(authors)):
+                with self.assertNumQueries(3):
+                    results = self.get_subscriptions('?recipes_limit=2')
+                self.assertEqual(len(results), len(authors))
+
+    def test_newest_recipes(self):
+        for author in self.authors[1:]:
+            Follow.objects.create(user=self.user, author=author)
+        for subscription in self.get_subscriptions('?recipes_limit=2'):
+            newest = list(Recipe.objects.filter(
+                author_id=subscription['id']
+            ).order_by('-pub_date').values_list('pk', flat=True)[:2])
+            self.assertEqual(
+                [recipe['id'] for recipe in subscription['recipes']], newest
+            )
+            self.assertEqual(
+                subscription['recipes_count'],
+                Recipe.objects.filter(author_id=subscription['id']).count()
+            )
+            self.assertTrue(subscription['is_subscribed'])
+
+    def test_without_limit(self):
+        total = Recipe.objects.filter(author=self.authors[0]).count()
+        for query in ('', '?recipes_limit=abc', '?recipes_limit='):
+            with self.subTest(query=query):
+                subscription, = self.get_subscriptions(query)
+                self.assertEqual(len(subscription['recipes']), total)
+
+
+class IngredientSearchTest(TestCase):
+    """Поиск: сначала префикс, затем вхождение, затем опечатки."""
+
+    names = ('Сахар', 'Сахарная пудра', 'Ванильный сахар', 'Соль', 'Сыр')
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in cls.names:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        # Индекс мог остаться от других тестов с той же версией.
+        patcher = mock.patch('api.search._index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search_api(self, value):
+        response = self.client.get(f'/api/ingredients/?name={value}')
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def search_index(self, value):
+        index = IngredientIndex(
+            Ingredient.objects.values_list('pk', 'name')
+        )
+        names = dict(Ingredient.objects.values_list('pk', 'name'))
+        return [names[pk] for pk in index.search(value)]
+
+    def test_ranking(self):
+        for search in (self.search_api, self.search_index):
+            with self.subTest(search=search.__name__):
+                self.assertEqual(
+                    search('сахар'),
+                    ['Сахар', 'Сахарная пудра', 'Ванильный сахар']
+                )
+                self.assertEqual(search('СЫ'), ['Сыр'])
+
+    def test_typo(self):
+        for search in (self.search_api, self.search_index):
+            with self.subTest(search=search.__name__):
+                found = search('сохар')
+                self.assertEqual(found[0], 'Сахар')
+                self.assertNotIn('Соль', found)
+
+
+class ShoppingListDownloadTest(RecipeAPITestCase):
+    """Формат списка покупок по ?format= и заголовку Accept."""
+
+    path = '/api/recipes/download_shopping_cart/'
+
+    def download(self, query='', **headers):
+        response = self.client.get(f'{self.path}{query}', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def get_expected(self):
+        return [
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+            for name, unit, amount in ShoppingCartIngredient.objects.filter(
+                user=self.user
+            ).order_by('ingredient__name').values_list(
+                'ingredient__name', 'ingredient__measurement_unit', 'amount'
+            )
+        ]
+
+    def assertAttachment(self, response, content_type, extension):
+        self.assertEqual(response['Content-Type'], content_type)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="shopping_list.{extension}"'
+        )
+
+    def test_formats(self):
+        expected = self.get_expected()
+        response, content = self.download('?format=json')
+        self.assertAttachment(
+            response, 'application/json; charset=utf-8', 'json'
+        )
+        self.assertEqual(json.loads(content), expected)
+        response, content = self.download('?format=csv')
+        self.assertAttachment(response, 'text/csv; charset=utf-8', 'csv')
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0], 'name,measurement_unit,amount')
+        self.assertEqual(
+            lines[1],
+            '{name},{measurement_unit},{amount}'.format(**expected[0])
+        )
+        self.assertEqual(len(lines), len(expected) + 1)
+        response, content = self.download('?format=txt')
+        self.assertAttachment(response, 'text/plain; charset=utf-8', 'txt')
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(
+            lines[1],
+            '1. {name}, {amount} {measurement_unit}.'.format(**expected[0])
+        )
+
+    def test_accept_header(self):
+        response, content = self.download(HTTP_ACCEPT='text/csv')
+        self.assertAttachment(response, 'text/csv; charset=utf-8', 'csv')
+        for accept in ('*/*', 'application/pdf'):
+            with self.subTest(accept=accept):
+                response, content = self.download(HTTP_ACCEPT=accept)
+                self.assertAttachment(response, 'application/pdf', 'pdf')
+                self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_unauthorized_is_json(self):
+        self.client.force_authenticate(None)
+        for query, accept in (('?format=csv', '*/*'), ('', 'text/plain')):
+            with self.subTest(query=query, accept=accept):
+                response = self.client.get(
+                    f'{self.path}{query}', HTTP_ACCEPT=accept
+                )
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json'
+                )
+                self.assertIn('detail', json.loads(response.content))
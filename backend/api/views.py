@@ -1,22 +1,35 @@
-from django.db.models import Sum
+import hashlib
+
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.cache import get_version
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from users.models import Follow, User
 
 from .download_in_pdf import create_pdf_file
 from .filters import IngredientSearchFilter, RecipeFilter
-from .paginations import LimitPageNumberPagination
+from .mixins import CatalogueCacheMixin
+from .paginations import LimitPageNumberPagination, RecipePagination
+from .parsers import StreamingBase64JSONParser
 from .permissions import IsAuthorStaffOrReadOnly
-from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          FollowSerializer, IngredientSerializer,
-                          RecipeSerializer, ShoppingCartSerializer,
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from .serializers import (CreateRecipeSerializer, FollowListSerializer,
+                          IngredientSerializer, RecipeSerializer,
                           ShortRecipeResponseSerializer,
                           SubscriptionShowSerializer, TagSerializer)
 
@@ -28,17 +41,26 @@ class FollowViewSet(UserViewSet):
 
     @action(methods=['get'], detail=False)
     def subscriptions(self, request):
-        authors = User.objects.filter(following__user=request.user)
+        recipes_limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit and recipes_limit.isdigit():
+            # Первые recipes_limit рецептов каждого автора одним запросом.
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('author')
+                    ).values('pk')[:int(recipes_limit)]
+                )
+            )
+        authors = User.objects.filter(
+            following__user=request.user
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
         result_pages = self.paginate_queryset(queryset=authors)
-        # Вернула чтение recipes_limit,
-        # потому что иначе много рецептов показывает
-        recipes_limit = request.query_params['recipes_limit']
         serializer = SubscriptionShowSerializer(
             result_pages,
-            context={
-                'request': request,
-                'recipes_limit': recipes_limit
-            },
+            context={'request': request},
             many=True
         )
         return self.get_paginated_response(serializer.data)
@@ -47,41 +69,43 @@ class FollowViewSet(UserViewSet):
     def subscribe(self, request, id):
         """Добавляет или удаляет из подписок."""
         if request.method == 'DELETE':
-            subscription = Follow.objects.filter(
-                user=request.user,
-                author=get_object_or_404(User, id=id)
-            )
-            if subscription.exists():
-                subscription.delete()
+            if Follow.objects.remove(user=request.user, author_id=id):
                 return Response(
                     {'errors': 'Вы отписались.'},
                     status=status.HTTP_204_NO_CONTENT
                 )
+            get_object_or_404(User, id=id)
             return Response(
                 {'errors': 'Вы уже отписались или не были подписаны'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        serializer = FollowSerializer(
-            data={
-                'user': request.user.id,
-                'author': get_object_or_404(User, id=id).id
-            },
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        author = get_object_or_404(User, id=id)
+        if author == request.user:
+            raise ValidationError(
+                {'author': ['Нельзя подписаться на самого себя.']}
+            )
+        if not Follow.objects.add(user=request.user, author=author):
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['Вы уже подписаны.']}
+            )
+        serializer = FollowListSerializer(
+            author, context={'request': request}
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет класса Tag."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
+    # Справочник публичный, проверка токена только лишний запрос к БД.
+    authentication_classes = ()
+    cache_model = Tag
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogueCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет класса Ingredient."""
 
     queryset = Ingredient.objects.all()
@@ -89,42 +113,135 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientSearchFilter
     permission_classes = (permissions.AllowAny,)
+    authentication_classes = ()
+    cache_model = Ingredient
 
 
 class RecipeViewSet(ModelViewSet):
     """Вьюсет класса Recipe."""
 
-    queryset = Recipe.objects.select_related('author')
+    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorStaffOrReadOnly,)
-    pagination_class = LimitPageNumberPagination
+    pagination_class = RecipePagination
+    parser_classes = (StreamingBase64JSONParser, FormParser, MultiPartParser)
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
 
+    def get_queryset(self):
+        return Recipe.objects.with_details(self.request.user)
+
+    def get_validator_rows(self, queryset):
+        """Поля, от которых зависит ответ, без загрузки самих рецептов.
+
+        Кроме полей рецепта сюда входят поля автора, которые выводит
+        UserSerializer: переименование автора не трогает updated.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            author_followed = Value(False, output_field=BooleanField())
+        else:
+            author_followed = Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            )
+        return queryset.prefetch_related(None).annotate(
+            author_followed=author_followed
+        ).values(
+            'pk', 'pub_date', 'updated', 'is_favorited',
+            'is_in_shopping_cart', 'author_followed', 'author__email',
+            'author__username', 'author__first_name', 'author__last_name'
+        )
+
+    def get_conditional_response(self, rows, page_state=None):
+        """Возвращает 304, если ответ у клиента не устарел.
+
+        Решение принимается только по ETag: Last-Modified не меняется
+        при добавлении в избранное или корзину, поэтому отдаётся лишь
+        как дополнительный заголовок. Переименование тега или
+        ингредиента меняет ETag через версии справочников, а удаление
+        рецепта с другой страницы ленты — через page_state.
+        """
+        etag = quote_etag(hashlib.md5(
+            repr((
+                self.request.user.pk,
+                get_version(Tag),
+                get_version(Ingredient),
+                page_state,
+                [list(row.values()) for row in rows],
+            )).encode()
+        ).hexdigest())
+        last_modified = max(
+            (row['updated'] for row in rows), default=None
+        )
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        not_modified = get_conditional_response(self.request, etag=etag)
+        return not_modified, etag, last_modified
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(self.get_validator_rows(queryset))
+        not_modified, etag, last_modified = self.get_conditional_response(
+            rows, self.paginator.get_page_state()
+        )
+        if not_modified is not None:
+            return self.set_validators(not_modified, etag, last_modified)
+        recipes = self.get_queryset().in_bulk([row['pk'] for row in rows])
+        serializer = self.get_serializer(
+            [recipes[row['pk']] for row in rows if row['pk'] in recipes],
+            many=True
+        )
+        return self.set_validators(
+            self.get_paginated_response(serializer.data),
+            etag,
+            last_modified
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            rows = list(self.get_validator_rows(
+                self.get_queryset().filter(pk=kwargs['pk'])
+            ))
+        except (TypeError, ValueError):
+            raise Http404
+        if not rows:
+            raise Http404
+        not_modified, etag, last_modified = self.get_conditional_response(
+            rows
+        )
+        if not_modified is not None:
+            return self.set_validators(not_modified, etag, last_modified)
+        return self.set_validators(
+            super().retrieve(request, *args, **kwargs),
+            etag,
+            last_modified
+        )
+
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeSerializer
         return CreateRecipeSerializer
 
     @staticmethod
-    def post_for_shopping_cart_and_favorite(request, pk, serializer_req):
+    def post_for_shopping_cart_and_favorite(request, pk, model, message):
         recipe = get_object_or_404(Recipe, pk=pk)
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializer_req(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not model.objects.add(user=request.user, recipe=recipe):
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+            )
         serializer_data = ShortRecipeResponseSerializer(recipe)
         return Response(serializer_data.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_for_shopping_cart_and_favorite(request, pk, location, model):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        obj = model.objects.filter(
-            user=request.user,
-            recipe=recipe
-        )
-        if obj.exists():
-            obj.delete()
+        if model.objects.remove(user=request.user, recipe_id=pk):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, pk=pk)
         return Response(
             {'errors': f'Рецепт уже удален из {location}'},
             status=status.HTTP_400_BAD_REQUEST
@@ -134,7 +251,8 @@ class RecipeViewSet(ModelViewSet):
     def favorite(self, request, pk):
         if request.method == 'POST':
             return self.post_for_shopping_cart_and_favorite(
-                request, pk, FavoriteSerializer
+                request, pk, Favorite,
+                'Вы уже добавляли это рецепт в избранное.'
             )
         return self.delete_for_shopping_cart_and_favorite(
             request, pk, 'избранного', Favorite
@@ -144,7 +262,8 @@ class RecipeViewSet(ModelViewSet):
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
             return self.post_for_shopping_cart_and_favorite(
-                request, pk, ShoppingCartSerializer
+                request, pk, ShoppingCart,
+                'Этот рецепт уже в списке покупок.'
             )
         return self.delete_for_shopping_cart_and_favorite(
             request, pk, 'списка покупок', ShoppingCart
@@ -153,17 +272,34 @@ class RecipeViewSet(ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(permissions.IsAuthenticated,)
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListPDFRenderer,
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        )
     )
     def download_shopping_cart(self, request):
         shopping_cart = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_cart__user=request.user
+            ShoppingCartIngredient.objects.filter(
+                user=request.user
             ).values(
                 'ingredient__name',
                 'ingredient__measurement_unit',
+                total_ingredient_amount=F('amount'),
             ).order_by(
                 'ingredient__name'
-            ).annotate(total_ingredient_amount=Sum('amount'))
+            )
+        )
+        renderer = request.accepted_renderer
+        if renderer.format == ShoppingListPDFRenderer.format:
+            return create_pdf_file(shopping_cart)
+        response = StreamingHttpResponse(
+            renderer.stream(shopping_cart.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"'
         )
-        return create_pdf_file(shopping_cart)
+        return response
@@ -0,0 +1,86 @@
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class ConnectionMixin:
+    """Проверка постоянных соединений и пул соединений.
+
+    CONN_HEALTH_CHECKS перенесён из Django 4.1: соединение, оставшееся
+    от прошлого запроса, проверяется is_usable() перед первым запросом
+    к базе и при ошибке переоткрывается, а не отдаёт 500.
+
+    POOL = {'MAX_SIZE': n} включает общий для потоков пул: close()
+    возвращает соединение в пул, connect() берёт его оттуда. С пулом
+    CONN_MAX_AGE ставится в 0, чтобы соединение освобождалось в конце
+    каждого запроса.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool_key = None
+        options = self.settings_dict.get('POOL') or {}
+        self.pool = (
+            get_pool(self.alias, options) if options.get('MAX_SIZE') else None
+        )
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_new_connection(self, conn_params):
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        self.pool_key = repr(sorted(conn_params.items()))
+        return self.pool.get(
+            lambda: super(ConnectionMixin, self).get_new_connection(
+                conn_params
+            ),
+            self.pool_key
+        )
+
+    def connect(self):
+        # Новое соединение проверять незачем, а проверка внутри
+        # connect() открыла бы транзакцию до set_autocommit().
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # Обёртка продолжит ссылаться на соединение до конца
+            # atomic, отдавать его другому потоку нельзя.
+            self.pool.discard(self.connection)
+        else:
+            self.pool.put(self.connection, self.pool_key)
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def set_autocommit(self, *args, **kwargs):
+        self.close_if_health_check_failed()
+        return super().set_autocommit(*args, **kwargs)
+
+
+class DatabaseWrapper(ConnectionMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
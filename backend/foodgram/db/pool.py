@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """Свободного соединения не дождались за TIMEOUT секунд."""
+
+
+class ConnectionPool:
+    """Пул соединений DB-API внутри процесса, общий для всех потоков.
+
+    Соединение выдаётся свободное или открывается новое, пока их меньше
+    max_size; иначе поток ждёт возврата не дольше timeout. Соединение,
+    простоявшее дольше ping_after секунд, перед выдачей проверяется
+    запросом SELECT 1. После fork пул начинается заново: соединения
+    родителя дочернему процессу не принадлежат, и put() или discard()
+    соединения, выданного не этим пулом в этом процессе, ничего не делают.
+
+    key описывает параметры подключения. Свободное соединение с другим
+    key (сменились NAME или HOST, например при создании тестовой базы)
+    не выдаётся, а закрывается.
+    """
+
+    def __init__(self, alias, max_size, timeout=10, ping_after=30):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # Стек (соединение, key, время возврата): последнее вернувшееся
+        # выдаётся первым, лишние дольше простаивают.
+        self.idle = []
+        self.in_use = set()
+        self.size = 0
+        self.counters = Counter()
+        self.wait_total = 0
+        self.wait_max = 0
+
+    def get(self, connect, key=None):
+        started = time.monotonic()
+        stale = []
+        with self.condition:
+            if self.pid != os.getpid():
+                self.reset()
+            while True:
+                stale.extend(self.pop_stale(key))
+                if self.idle or self.size < self.max_size:
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    logger.warning(
+                        'Пул %s: нет свободного соединения за %s с',
+                        self.alias, self.timeout
+                    )
+                    raise PoolTimeout(
+                        f'Пул соединений {self.alias} исчерпан.'
+                    )
+                self.condition.wait(remaining)
+            waited = time.monotonic() - started
+            self.counters['checkouts'] += 1
+            if waited > 0.001:
+                self.counters['waits'] += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if self.idle:
+                connection, _, returned = self.idle.pop()
+            else:
+                connection, returned = None, None
+                self.size += 1
+        for stale_connection in stale:
+            self.close(stale_connection)
+        if (
+            connection is not None
+            and time.monotonic() - returned > self.ping_after
+            and not self.ping(connection)
+        ):
+            # Место в пуле остаётся за этим потоком.
+            self.counters['discarded'] += 1
+            self.close(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = connect()
+            except Exception:
+                self.release()
+                raise
+            self.counters['opened'] += 1
+        with self.condition:
+            self.in_use.add(connection)
+        return connection
+
+    def pop_stale(self, key):
+        """Убирает из свободных соединения с другим key, под condition."""
+        stale = [item[0] for item in self.idle if item[1] != key]
+        if stale:
+            self.idle = [item for item in self.idle if item[1] == key]
+            self.size -= len(stale)
+            self.counters['discarded'] += len(stale)
+        return stale
+
+    def put(self, connection, key=None):
+        if not self.check_in(connection):
+            return
+        try:
+            # Незавершённая транзакция не должна достаться другому.
+            connection.rollback()
+        except Exception:
+            self.drop(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, key, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection):
+        if self.check_in(connection):
+            self.drop(connection)
+
+    def check_in(self, connection):
+        """Снимает отметку о выдаче, если соединение выдано этим пулом."""
+        with self.condition:
+            if self.pid != os.getpid() or connection not in self.in_use:
+                return False
+            self.in_use.remove(connection)
+            return True
+
+    def drop(self, connection):
+        self.counters['discarded'] += 1
+        self.close(connection)
+        self.release()
+
+    def clear(self):
+        """Закрывает свободные соединения, выданные остаются за потоками."""
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for connection, _, _ in idle:
+            self.close(connection)
+
+    def release(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @staticmethod
+    def ping(connection):
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.condition:
+            checkouts = self.counters['checkouts']
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'max_size': self.max_size,
+                'checkouts': checkouts,
+                'waits': self.counters['waits'],
+                'wait_avg_ms': round(
+                    self.wait_total / checkouts * 1000 if checkouts else 0, 3
+                ),
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'timeouts': self.counters['timeouts'],
+                'opened': self.counters['opened'],
+                'discarded': self.counters['discarded'],
+            }
+
+
+def get_pool(alias, options):
+    """Пул для базы alias, создаётся при первом обращении."""
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                alias,
+                options['MAX_SIZE'],
+                timeout=options.get('TIMEOUT', 10),
+                ping_after=options.get('PING_AFTER', 30),
+            )
+        return _pools[alias]
+
+
+def get_pool_stats():
+    """Метрики всех пулов процесса по псевдонимам баз."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,11 @@
+def get_peak_rss():
+    """Пик RSS текущего процесса в КБ, для команд benchmark_*.
+
+    Берётся VmHWM из /proc: ru_maxrss в Linux наследуется через fork
+    и exec, и дочерний процесс начинает с пика родителя.
+    """
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    raise OSError('Нет VmHWM в /proc/self/status.')
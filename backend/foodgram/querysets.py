@@ -0,0 +1,42 @@
+from django.db import IntegrityError, models, transaction
+
+
+class RelationQuerySet(models.QuerySet):
+    """Идемпотентные добавление и удаление связи пользователя с объектом.
+
+    Нужен подпискам, избранному и корзинам. Повторный запрос не падает
+    на уникальном индексе, а сигналы save() и delete() отправляются
+    только при реальном изменении и с сохранённым объектом, поэтому
+    счётчики и сводные таблицы обновляются как обычно.
+    """
+
+    def add(self, **fields):
+        """Создаёт связь через create(), True если строка добавлена.
+
+        Вставка идёт в точке сохранения, как в get_or_create: дубль
+        откатывает только её. Параллельная вставка той же связи ждёт
+        первую транзакцию и получает IntegrityError. Прочие ошибки
+        целостности пробрасываются.
+        """
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(**fields)
+        except IntegrityError:
+            if self.filter(**fields).exists():
+                return False
+            raise
+        return True
+
+    def remove(self, **fields):
+        """Удаляет связь через delete(), True если она была.
+
+        Строка сначала блокируется SELECT ... FOR UPDATE: параллельное
+        удаление той же связи ждёт и уже не находит её, поэтому сигналы
+        удаления отправляются ровно один раз.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            instance = self.select_for_update().filter(**fields).first()
+            if instance is None:
+                return False
+            instance.delete()
+        return True
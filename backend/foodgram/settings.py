@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'django_filters',
@@ -34,6 +36,7 @@ INSTALLED_APPS = [
     'api'
 ]
 MIDDLEWARE = [
+    'api.profiling.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaMiddleware',
 ]
 ROOT_URLCONF = 'foodgram.urls'
 
@@ -63,17 +67,48 @@ TEMPLATES = [
 ]
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Пул соединений на процесс для потоковых воркеров, 0 — без пула.
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=0)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL с проверкой соединений и пулом, см. foodgram.db.
+        'ENGINE': 'foodgram.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Секунды жизни соединения между запросами, 0 — закрывать сразу.
+        # С пулом соединение возвращается в пул в конце запроса.
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else env.int(
+            'DB_CONN_MAX_AGE', default=60
+        ),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': env.float('DB_POOL_TIMEOUT', default=10),
+            'PING_AFTER': env.float('DB_POOL_PING_AFTER', default=30),
+        },
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=replica1,replica2.
+DATABASE_REPLICAS = []
+for number, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной базы.
+DATABASE_REPLICA_STICKY_SECONDS = env.int(
+    'DB_REPLICA_STICKY_SECONDS', default=10
+)
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -108,6 +143,50 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии картинок рецептов готовятся в фоновых потоках.
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+IMAGE_PROCESSING_WORKERS = env.int('IMAGE_PROCESSING_WORKERS', default=2)
+IMAGE_PROCESSING_ASYNC = env.bool('IMAGE_PROCESSING_ASYNC', default=True)
+
+# Профилирование запросов к БД: Server-Timing и лог api.profiling.
+QUERY_PROFILER = env.bool('QUERY_PROFILER', default=False)
+QUERY_PROFILER_REPEAT_THRESHOLD = env.int(
+    'QUERY_PROFILER_REPEAT_THRESHOLD', default=2
+)
+
+# Общий для всех процессов кэш: версии справочников и привязка клиента
+# к основной базе должны быть видны каждому воркеру, админке и командам.
+# Без memcached кэш лежит на диске и общий только в пределах хоста.
+MEMCACHED_LOCATION = env.list('MEMCACHED_LOCATION', default=[])
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': MEMCACHED_LOCATION,
+    } if MEMCACHED_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env(
+            'CACHE_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'TIMEOUT': None,
+    },
+    # Готовые PDF списков покупок: на диске, не больше MAX_ENTRIES.
+    'shopping_lists': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env(
+            'SHOPPING_LIST_CACHE_DIR',
+            default=os.path.join(
+                tempfile.gettempdir(), 'foodgram_shopping_lists'
+            )
+        ),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+}
+
 DATA_FILES_DIR = os.path.join(BASE_DIR, 'data')
 FONTS_FILES_DIR = os.path.join(DATA_FILES_DIR, 'HelveticaRegular.ttf')
 
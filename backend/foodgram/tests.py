@@ -0,0 +1,148 @@
+import sqlite3
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from .db.base import DatabaseWrapper
+from .db.pool import ConnectionPool, PoolTimeout
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Пул на соединениях sqlite3 в памяти."""
+
+    def setUp(self):
+        self.pool = ConnectionPool('test', 1, timeout=0.05, ping_after=60)
+
+    @staticmethod
+    def connect():
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    def assertClosed(self, connection):
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+
+    def test_timeout_when_full(self):
+        self.pool.get(self.connect)
+        with self.assertRaises(PoolTimeout):
+            self.pool.get(self.connect)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    def test_discard_frees_slot(self):
+        connection = self.pool.get(self.connect)
+        self.pool.discard(connection)
+        self.assertClosed(connection)
+        self.assertIsNot(self.pool.get(self.connect), connection)
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def test_reuse_idle(self):
+        connection = self.pool.get(self.connect)
+        self.pool.put(connection)
+        self.assertIs(self.pool.get(self.connect), connection)
+        self.assertEqual(self.pool.stats()['opened'], 1)
+
+    def test_dead_idle_replaced_after_ping_after(self):
+        self.pool.ping_after = 0
+        connection = self.pool.get(self.connect)
+        self.pool.put(connection)
+        connection.close()
+        replacement = self.pool.get(self.connect)
+        self.assertIsNot(replacement, connection)
+        replacement.execute('SELECT 1')
+        stats = self.pool.stats()
+        self.assertEqual(
+            (stats['size'], stats['opened'], stats['discarded']), (1, 2, 1)
+        )
+
+    def test_reset_after_fork(self):
+        connection = self.pool.get(self.connect)
+        self.pool.put(connection)
+        with mock.patch('foodgram.db.pool.os.getpid', return_value=-1):
+            self.assertIsNot(self.pool.get(self.connect), connection)
+            stats = self.pool.stats()
+            self.assertEqual((stats['size'], stats['idle']), (1, 0))
+            # Соединение родителя не попадает в пул потомка.
+            self.pool.put(connection)
+            self.pool.discard(connection)
+            stats = self.pool.stats()
+            self.assertEqual((stats['size'], stats['idle']), (1, 0))
+        connection.execute('SELECT 1')
+
+    def test_clear_closes_idle(self):
+        self.pool.max_size = 2
+        busy, idle = self.pool.get(self.connect), self.pool.get(self.connect)
+        self.pool.put(idle)
+        self.pool.clear()
+        self.assertClosed(idle)
+        busy.execute('SELECT 1')
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def test_other_key_not_reused(self):
+        connection = self.pool.get(self.connect, 'foodgram')
+        self.pool.put(connection, 'foodgram')
+        replacement = self.pool.get(self.connect, 'test_foodgram')
+        self.assertIsNot(replacement, connection)
+        self.assertClosed(connection)
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+
+class ConnectionMixinTest(SimpleTestCase):
+    """Проверка соединения и возврат в пул без обращения к базе."""
+
+    def setUp(self):
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'ENGINE': 'foodgram.db',
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': {},
+        }, 'health_check')
+        self.wrapper.connection = mock.Mock()
+
+    def test_failed_health_check_closes(self):
+        old = self.wrapper.connection
+        with mock.patch.object(
+            self.wrapper, 'is_usable', return_value=False
+        ) as is_usable:
+            self.wrapper.close_if_health_check_failed()
+            self.wrapper.close_if_health_check_failed()
+        is_usable.assert_called_once_with()
+        old.close.assert_called_once_with()
+        self.assertIsNone(self.wrapper.connection)
+
+    def test_close_inside_atomic_discards(self):
+        self.wrapper.pool = mock.Mock()
+        old = self.wrapper.connection
+        self.wrapper.in_atomic_block = True
+        self.wrapper._close()
+        self.wrapper.pool.discard.assert_called_once_with(old)
+        self.wrapper.in_atomic_block = False
+        self.wrapper._close()
+        self.wrapper.pool.put.assert_called_once_with(old, None)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Бэкенд foodgram.db для PostgreSQL.'
+)
+class HealthCheckConnectTest(TestCase):
+    """Новое соединение не проверяется, старое — перед первым запросом."""
+
+    def test_connect_skips_health_check(self):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'ENGINE': 'foodgram.db',
+            'CONN_HEALTH_CHECKS': True,
+            'CONN_MAX_AGE': None,
+            'POOL': {},
+        }, connection.alias)
+        self.addCleanup(wrapper.close)
+        with mock.patch.object(
+            wrapper, 'is_usable', wraps=wrapper.is_usable
+        ) as is_usable:
+            wrapper.connect()
+            self.assertTrue(wrapper.get_autocommit())
+            is_usable.assert_not_called()
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            is_usable.assert_called_once_with()
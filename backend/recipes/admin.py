@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.admin import display
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingCartIngredient, Tag)
 
 
 @admin.register(Ingredient)
@@ -47,7 +47,15 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @display(description='Добавили в избранное')
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет ингредиенты и обновляет корзины с этим рецептом."""
+        recipe = form.instance
+        old_amounts = recipe.get_ingredient_amounts() if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingCartIngredient.objects.change_recipe(recipe, old_amounts)
 
 
 @admin.register(Favorite)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version_key(model):
+    return f'catalogue_version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Текущая версия справочника, общая для всех процессов.
+
+    Хранится в кэше default, который настроен общим для процессов
+    (memcached или файловый), поэтому изменение в любом воркере,
+    админке или команде сбрасывает кэши во всех остальных.
+    """
+    key = get_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(model):
+    """Сбрасывает кэши справочника во всех процессах."""
+    cache.set(get_version_key(model), time.time_ns(), None)
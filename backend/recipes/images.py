@@ -0,0 +1,104 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipe_images/variants'
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    return _executor
+
+
+def render_variants(image_name):
+    """Сохраняет уменьшенные копии картинки и возвращает их пути."""
+    with default_storage.open(image_name) as file:
+        with Image.open(file) as original:
+            original = original.convert('RGB')
+    stem = PurePosixPath(image_name).stem
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        variants[variant] = {}
+        for extension, image_format in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, quality=85)
+            variants[variant][extension] = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(variants):
+    for paths in variants.values():
+        for path in paths.values():
+            default_storage.delete(path)
+
+
+def process_recipe_image(recipe_id, image_name):
+    """Готовит варианты картинки и сохраняет их пути в рецепт.
+
+    Если картинку успели заменить или рецепт удалили, созданные файлы
+    удаляются, а результат отбрасывается.
+    """
+    old_variants = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image_variants', flat=True
+    ).first()
+    variants = render_variants(image_name)
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants,
+        updated=timezone.now()
+    )
+    delete_variants(old_variants if updated and old_variants else {})
+    if not updated:
+        delete_variants(variants)
+
+
+def process_in_background(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_image_processing(recipe):
+    """Ставит обработку картинки в очередь после коммита транзакции."""
+    if not recipe.image:
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_PROCESSING_ASYNC:
+            get_executor().submit(
+                process_in_background, recipe_id, image_name
+            )
+        else:
+            process_recipe_image(recipe_id, image_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand, call_command
+from django.db import connection
+from recipes.models import Favorite, Recipe, ShoppingCartIngredient
+
+from .generate_data import PREFIX
+
+
+def get_queries(user, recipe):
+    """Запросы ленты и корзины, которые опираются на индексы по user."""
+    return {
+        'is_favorited filter': Recipe.objects.filter(
+            favorites__user=user
+        ).order_by('-pub_date', '-id')[:6],
+        'is_in_shopping_cart filter': Recipe.objects.filter(
+            shopping_cart__user=user
+        ).order_by('-pub_date', '-id')[:6],
+        'user flags annotation': Recipe.objects.annotate_user_flags(
+            user
+        ).order_by('-pub_date', '-id')[:6],
+        'favorite exists': Favorite.objects.filter(
+            user=user, recipe=recipe
+        ),
+        'favorites by recipe': Favorite.objects.filter(
+            user=user
+        ).order_by('recipe_id').values_list('recipe_id', flat=True),
+        'shopping list': ShoppingCartIngredient.objects.filter(
+            user=user
+        ).order_by('ingredient__name').values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ),
+    }
+
+
+class Command(BaseCommand):
+    """Планы и время запросов по избранному и корзине на больших данных.
+
+    Пример: benchmark_favorites --seed --users 100000 --favorites 1000000
+    """
+
+    help = 'Замеряет запросы по избранному и корзине пользователя.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Сначала заполнить базу данными.')
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=1000000)
+        parser.add_argument('--carts', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Сколько раз выполнять каждый запрос.')
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            call_command(
+                'generate_data',
+                users=options['users'],
+                recipes=options['recipes'],
+                follows=0,
+                favorites=options['favorites'],
+                carts=options['carts'],
+                random_seed=options['random_seed'],
+                stdout=self.stdout,
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        favorite = Favorite.objects.filter(
+            user__username__startswith=PREFIX
+        ).order_by('pk').first()
+        if favorite is None:
+            self.stderr.write('Нет данных, запустите команду с --seed.')
+            return
+        queries = get_queries(favorite.user, favorite.recipe_id)
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f'median {statistics.median(timings):.3f} мс, '
+                f'p95 {statistics.quantiles(timings, n=20)[-1]:.3f} мс\n'
+            )
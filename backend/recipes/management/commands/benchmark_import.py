@@ -0,0 +1,138 @@
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from foodgram.memory import get_peak_rss
+from recipes.cache import bump_version
+from recipes.models import Ingredient
+
+from .generate_data import PREFIX
+
+IMPORT_PREFIX = f'{PREFIX}import_'
+UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.')
+INSERTED = re.compile(r'Добавлено (\d+)')
+
+
+def write_rows(path, file_format, total):
+    """Файл импорта из total уникальных синтетических ингредиентов."""
+    rows = (
+        (f'{IMPORT_PREFIX}{number}', UNITS[number % len(UNITS)])
+        for number in range(total)
+    )
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            writer = csv.writer(file)
+            writer.writerow(('name', 'measurement_unit'))
+            writer.writerows(rows)
+            return
+        file.write('[')
+        for number, (name, unit) in enumerate(rows):
+            file.write(',\n' if number else '\n')
+            json.dump(
+                {'name': name, 'measurement_unit': unit}, file,
+                ensure_ascii=False
+            )
+        file.write('\n]')
+
+
+class Command(BaseCommand):
+    """Время и пиковая память import_ingredients на большом файле.
+
+    Для каждого формата и размера пачки файл импортируется в пустой
+    справочник, затем повторно, когда все строки уже есть. Каждый
+    импорт идёт в отдельном процессе: печатается его пик RSS и прирост
+    пика за время импорта. Рядом с числом вставленных, которое
+    напечатал импорт, выводится фактический прирост таблицы.
+    Синтетические строки в конце удаляются.
+    """
+
+    help = 'Замеряет импорт ингредиентов из больших файлов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument(
+            '--formats', nargs='+', choices=('csv', 'json'),
+            default=['csv', 'json']
+        )
+        parser.add_argument(
+            '--batch-sizes', type=int, nargs='+', default=[1000, 5000]
+        )
+        parser.add_argument(
+            '--child', nargs=2, metavar=('PATH', 'BATCH_SIZE'),
+            help='Один импорт в текущем процессе.'
+        )
+
+    def handle(self, *args, **options):
+        if options['child']:
+            return self.measure(*options['child'])
+        synthetic = Ingredient.objects.filter(
+            name__startswith=IMPORT_PREFIX
+        )
+        self.delete_synthetic()
+        self.stdout.write(
+            f'{"формат":<7}{"пачка":>7}  {"запуск":<10}{"время, с":>9}'
+            f'{"пик RSS, МБ":>13}{"прирост, МБ":>13}'
+            f'{"добавлено":>11}{"в таблице":>11}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in options['formats']:
+                path = os.path.join(directory, f'rows.{file_format}')
+                write_rows(path, file_format, options['rows'])
+                for batch_size in options['batch_sizes']:
+                    self.delete_synthetic()
+                    for run in ('первый', 'повторный'):
+                        before = synthetic.count()
+                        result = subprocess.run(
+                            (sys.executable, sys.argv[0], 'benchmark_import',
+                             '--child', path, str(batch_size)),
+                            capture_output=True, text=True
+                        )
+                        if result.returncode:
+                            raise CommandError(result.stderr)
+                        elapsed, baseline, peak, output = json.loads(
+                            result.stdout
+                        )
+                        self.stdout.write(
+                            f'{file_format:<7}{batch_size:>7}  {run:<10}'
+                            f'{elapsed:>9.1f}{peak / 1024:>13.1f}'
+                            f'{(peak - baseline) / 1024:>13.1f}'
+                            f'{INSERTED.search(output)[1]:>11}'
+                            f'{synthetic.count() - before:>11}'
+                        )
+        self.delete_synthetic()
+
+    @staticmethod
+    def delete_synthetic():
+        """Удаляет строки импорта одним DELETE.
+
+        QuerySet.delete() ради сигналов справочника загрузил бы все
+        строки в память.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Ingredient._meta.db_table} '
+                'WHERE name LIKE %s',
+                [f'{IMPORT_PREFIX}%']
+            )
+        bump_version(Ingredient)
+
+    def measure(self, path, batch_size):
+        output = StringIO()
+        baseline = get_peak_rss()
+        started = time.perf_counter()
+        call_command(
+            'import_ingredients', path, batch_size=int(batch_size),
+            stdout=output
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(json.dumps(
+            (elapsed, baseline, get_peak_rss(), output.getvalue())
+        ))
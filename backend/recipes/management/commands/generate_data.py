@@ -0,0 +1,154 @@
+import io
+import random
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+PREFIX = 'synthetic_'
+BATCH_SIZE = 10000
+
+
+def sample_pairs(seed, left, right, total):
+    """Случайные уникальные пары (left, right) без перебора всех пар.
+
+    Свой генератор на каждую таблицу, чтобы повторный запуск выбирал
+    те же пары.
+    """
+    rng = random.Random(seed)
+    size = len(left) * len(right)
+    for number in rng.sample(range(size), min(total, size)):
+        yield left[number // len(right)], right[number % len(right)]
+
+
+def bulk_insert(model, rows):
+    """Вставляет строки пачками, не собирая их все в памяти."""
+    rows = iter(rows)
+    while True:
+        batch = [model(**row) for row in islice(rows, BATCH_SIZE)]
+        if not batch:
+            return
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    """Синтетические данные для нагрузочных замеров.
+
+    Пользователи, рецепты с ингредиентами и тегами, подписки, избранное
+    и корзины. Справочники берутся уже загруженные (load_data,
+    load_tags). Повторный запуск дополняет данные до заданных размеров
+    и ничего не дублирует; счётчики и сводные списки покупок
+    пересчитываются в конце.
+    """
+
+    help = 'Генерирует синтетических пользователей, рецепты и связи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        seed = options['random_seed']
+        rng = random.Random(seed)
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        tag_ids = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Справочники пусты, сначала выполните load_data и load_tags.'
+            )
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                rng, user_ids, ingredient_ids, tag_ids, options
+            )
+            bulk_insert(Follow, (
+                {'user_id': user, 'author_id': author}
+                for user, author in sample_pairs(
+                    f'{seed}:follows', user_ids, user_ids,
+                    options['follows']
+                )
+                if user != author
+            ))
+            for model, total in (
+                (Favorite, options['favorites']),
+                (ShoppingCart, options['carts']),
+            ):
+                name = model._meta.model_name
+                bulk_insert(model, (
+                    {'user_id': user, 'recipe_id': recipe}
+                    for user, recipe in sample_pairs(
+                        f'{seed}:{name}', user_ids, recipe_ids, total
+                    )
+                ))
+            # bulk_create не отправляет сигналы, поэтому производные
+            # данные пересобираются командами сверки.
+            call_command('recount_counters', stdout=io.StringIO())
+            call_command('rebuild_shopping_cart', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей {len(user_ids)}, рецептов {len(recipe_ids)}; '
+            f'готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def create_users(self, total):
+        bulk_insert(User, (
+            {
+                'username': f'{PREFIX}{number}',
+                'email': f'{PREFIX}{number}@example.com',
+                'first_name': 'Пользователь',
+                'last_name': str(number),
+                'password': '!',
+            }
+            for number in range(total)
+        ))
+        return list(User.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('pk').values_list('pk', flat=True)[:total])
+
+    def create_recipes(self, rng, user_ids, ingredient_ids, tag_ids, options):
+        total = options['recipes']
+        existing = Recipe.objects.filter(name__startswith=PREFIX).count()
+        bulk_insert(Recipe, (
+            {
+                'author_id': rng.choice(user_ids),
+                'name': f'{PREFIX}{number}',
+                'text': 'Синтетический рецепт для замеров.',
+                'cooking_time': rng.randint(5, 180),
+            }
+            for number in range(existing, total)
+        ))
+        recipe_ids = list(Recipe.objects.filter(
+            name__startswith=PREFIX
+        ).order_by('pk').values_list('pk', flat=True)[:total])
+        new_ids = recipe_ids[existing:]
+        per_recipe = min(
+            options['ingredients_per_recipe'], len(ingredient_ids)
+        )
+        bulk_insert(RecipeIngredient, (
+            {
+                'recipe_id': recipe,
+                'ingredient_id': ingredient,
+                'amount': rng.randint(1, 500),
+            }
+            for recipe in new_ids
+            for ingredient in rng.sample(ingredient_ids, per_recipe)
+        ))
+        per_recipe = min(options['tags_per_recipe'], len(tag_ids))
+        bulk_insert(Recipe.tags.through, (
+            {'recipe_id': recipe, 'tag_id': tag}
+            for recipe in new_ids
+            for tag in rng.sample(tag_ids, per_recipe)
+        ))
+        return recipe_ids
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+def process(row):
+    recipe_id, image_name = row
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception as error:
+        return f'Рецепт {recipe_id}: {error}'
+
+
+def process_in_thread(row):
+    try:
+        return process(row)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Готовит уменьшенные копии картинок уже сохранённых рецептов.
+
+    Нужна для рецептов, созданных до появления вариантов, и после
+    смены RECIPE_IMAGE_VARIANTS (с --all). Прежние варианты рецепта
+    удаляются после замены.
+    """
+
+    help = 'Генерирует варианты картинок для существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты и у рецептов, где они уже есть.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_PROCESSING_WORKERS,
+            help='Число потоков; 1 — обработка в текущем потоке.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        recipes = list(recipes.values_list('pk', 'image'))
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(
+                max_workers=options['workers']
+            ) as executor:
+                results = list(executor.map(process_in_thread, recipes))
+        else:
+            results = [process(row) for row in recipes]
+        errors = [error for error in results if error is not None]
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Варианты готовы для {len(recipes) - len(errors)} рецептов, '
+            f'ошибок {len(errors)}'
+        ))
@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import re
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import reset_queries
+from foodgram.settings import DATA_FILES_DIR, MAX_LENGTH
+from recipes.cache import bump_version
+from recipes.models import Ingredient
+
+CHUNK_SIZE = 64 * 1024
+CSV_HEADER = ['name', 'measurement_unit']
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Элементы JSON-массива по одному, не читая файл целиком.
+
+    В памяти держится только текущий кусок файла и один элемент.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    expected = '['
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position < len(buffer):
+            char = buffer[position]
+            if expected == '[':
+                if char != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                position += 1
+                expected = 'item'
+                continue
+            if char == ']':
+                return
+            if expected == ',':
+                if char != ',':
+                    raise CommandError('Ошибка в файле JSON.')
+                position += 1
+                expected = 'item'
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                expected = ','
+                yield item
+                continue
+        chunk = file.read(chunk_size)
+        if not chunk:
+            raise CommandError('Файл JSON оборвался или содержит ошибку.')
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_json(file):
+    for item in iter_json_array(file):
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None, None
+
+
+def iter_csv(file):
+    for number, row in enumerate(csv.reader(file)):
+        if number == 0 and row == CSV_HEADER:
+            continue
+        if len(row) != 2:
+            yield None, None
+            continue
+        yield row[0], row[1]
+
+
+class Command(BaseCommand):
+    """Потоковый импорт справочника ингредиентов из JSON или CSV.
+
+    Строки читаются по одной и пишутся пачками: для каждой пачки одним
+    запросом ищутся уже известные пары (name, measurement_unit), новые
+    вставляются через bulk_create. Повторный импорт ничего не
+    дублирует, память не зависит от размера файла.
+    """
+
+    help = 'Импортирует ингредиенты из JSON или CSV без дублей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(DATA_FILES_DIR, 'ingredients.json'),
+            help='Файл .json (массив объектов) или .csv (name,unit).'
+        )
+        parser.add_argument('--format', choices=('json', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path
+        )[1].lstrip('.').lower()
+        readers = {'json': iter_json, 'csv': iter_csv}
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        self.stats = {'inserted': 0, 'skipped': 0, 'invalid': 0}
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                batch = {}
+                for name, unit in readers[file_format](file):
+                    key = self.clean(name, unit)
+                    if key is None:
+                        self.stats['invalid'] += 1
+                    elif key in batch:
+                        self.stats['skipped'] += 1
+                    else:
+                        batch[key] = None
+                    if len(batch) >= options['batch_size']:
+                        self.save_batch(batch)
+                        batch = {}
+                self.save_batch(batch)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {path} не найден.')
+        if self.stats['inserted']:
+            bump_version(Ingredient)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Добавлено {inserted}, уже были {skipped}, '
+            'с ошибками {invalid}'.format(**self.stats)
+            + f'; {elapsed:.1f} с'
+        ))
+
+    @staticmethod
+    def clean(*values):
+        """Пара (name, measurement_unit) или None для битой строки."""
+        if not all(isinstance(value, str) for value in values):
+            return None
+        values = tuple(value.strip() for value in values)
+        if not all(0 < len(value) <= MAX_LENGTH for value in values):
+            return None
+        return values
+
+    @staticmethod
+    def get_existing(keys):
+        """Пары из keys, которые уже есть в справочнике."""
+        return set(Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit').order_by()) & set(keys)
+
+    def save_batch(self, batch):
+        if not batch:
+            return
+        existing = self.get_existing(batch)
+        new = [key for key in batch if key not in existing]
+        inserted = 0
+        if new:
+            # ignore_conflicts страхует от параллельного импорта, но
+            # пропущенные им строки bulk_create не сообщает, поэтому
+            # вставленные считаются повторным запросом.
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in new
+                ),
+                ignore_conflicts=True
+            )
+            inserted = len(self.get_existing(new))
+        self.stats['inserted'] += inserted
+        self.stats['skipped'] += len(batch) - inserted
+        # С DEBUG=True Django хранит текст всех запросов.
+        reset_queries()
@@ -1,29 +1,12 @@
-import json
-import os
-
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from foodgram.settings import DATA_FILES_DIR
-from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
-    """Загрузчик в БД из JSON файла."""
+    """Загрузчик в БД из JSON файла.
+
+    Оставлен для совместимости, импортом занимается import_ingredients.
+    """
 
     def handle(self, *args, **options):
-        file_name = 'ingredients.json'
-        json_path = os.path.join(DATA_FILES_DIR, file_name)
-        try:
-            with open(json_path, 'rb') as file:
-                data = json.load(file)
-                ingredients = [
-                    Ingredient(
-                        name=item.get('name'),
-                        measurement_unit=item.get('measurement_unit'),
-                    )
-                    for item in data
-                ]
-                Ingredient.objects.bulk_create(ingredients)
-            print('finished')
-        except FileNotFoundError:
-            print(f'Файл {file_name} не найден.')
-            return
+        call_command('import_ingredients', stdout=self.stdout)
@@ -1,4 +1,5 @@
 from django.core.management import BaseCommand
+from recipes.cache import bump_version
 from recipes.models import Tag
 
 
@@ -10,4 +11,5 @@ class Command(BaseCommand):
             {'name': 'Обед', 'color': '#90EE90', 'slug': 'lunch'},
             {'name': 'Ужин', 'color': '#87CEFA', 'slug': 'dinner'}]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        bump_version(Tag)
         self.stdout.write(self.style.SUCCESS('Все тэги загружены'))
@@ -0,0 +1,104 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from recipes.models import (RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Пересобирает сводные списки покупок и ищет расхождения."""
+
+    help = 'Пересобирает таблицу ShoppingCartIngredient из корзин.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, ничего не меняя.'
+        )
+
+    @staticmethod
+    def lock_tables():
+        """Запрещает запись в корзины до конца транзакции.
+
+        Чтение не блокируется. Без блокировки изменение корзины между
+        подсчётом и записью потерялось бы. SQLite и так допускает
+        только одну пишущую транзакцию.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        tables = ', '.join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (
+                ShoppingCart, RecipeIngredient, ShoppingCartIngredient
+            )
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE'
+            )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.lock_tables()
+            expected = {
+                (row['recipe__shopping_cart__user'], row['ingredient']):
+                    row['total']
+                for row in RecipeIngredient.objects.filter(
+                    recipe__shopping_cart__isnull=False
+                ).values(
+                    'recipe__shopping_cart__user', 'ingredient'
+                ).annotate(total=Sum('amount')).order_by()
+            }
+            stored = {
+                (row.user_id, row.ingredient_id): row
+                for row in ShoppingCartIngredient.objects.only(
+                    'user_id', 'ingredient_id', 'amount'
+                )
+            }
+            drift = [
+                key for key in expected.keys() | stored.keys()
+                if key not in stored
+                or expected.get(key) != stored[key].amount
+            ]
+            if options['check']:
+                if drift:
+                    raise CommandError(
+                        f'Расхождений в списках покупок: {len(drift)}'
+                    )
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            self.fix(drift, expected, stored)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны, исправлено строк: {len(drift)}'
+        ))
+
+    @staticmethod
+    def fix(drift, expected, stored):
+        """Удаляет, меняет и добавляет только расходящиеся строки."""
+        extra, changed, missing = [], [], []
+        for key in drift:
+            if key not in expected:
+                extra.append(stored[key].pk)
+            elif key in stored:
+                stored[key].amount = expected[key]
+                changed.append(stored[key])
+            else:
+                user_id, ingredient_id = key
+                missing.append(ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=expected[key]
+                ))
+        for start in range(0, len(extra), BATCH_SIZE):
+            ShoppingCartIngredient.objects.filter(
+                pk__in=extra[start:start + BATCH_SIZE]
+            ).delete()
+        ShoppingCartIngredient.objects.bulk_update(
+            changed, ['amount'], batch_size=BATCH_SIZE
+        )
+        ShoppingCartIngredient.objects.bulk_create(
+            missing, batch_size=BATCH_SIZE
+        )
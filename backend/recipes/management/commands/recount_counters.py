@@ -0,0 +1,57 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# (модель, поле счётчика, считаемая модель, ссылка на модель счётчика)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def get_actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """Сверяет и пересчитывает денормализованные счётчики."""
+
+    help = 'Пересчитывает счётчики избранного, корзин, рецептов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        drift = 0
+        for model, counter, counted_model, field in COUNTERS:
+            actual = get_actual_count(counted_model, field)
+            wrong = model.objects.annotate(actual=actual).exclude(
+                **{counter: F('actual')}
+            )
+            if options['check']:
+                count = wrong.count()
+            else:
+                count = model.objects.filter(
+                    pk__in=wrong.values('pk')
+                ).update(**{counter: actual})
+            drift += count
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: расхождений {count}'
+            )
+        if options['check'] and drift:
+            raise CommandError(f'Расхождений в счётчиках: {drift}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
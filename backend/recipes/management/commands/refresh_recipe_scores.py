@@ -0,0 +1,60 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import Favorite, Recipe
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Пересчитывает рейтинг рецептов для сортировки trending.
+
+    Каждое добавление в избранное за окно даёт вклад, который
+    убывает вдвое за каждый период полураспада. Запускается по cron.
+    """
+
+    help = 'Пересчитывает Recipe.trending по свежему избранному.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Окно в днях, за которое учитывается избранное.'
+        )
+        parser.add_argument(
+            '--half-life',
+            type=float,
+            default=24,
+            help='Период полураспада вклада в часах.'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        half_life = options['half_life'] * 3600
+        scores = defaultdict(float)
+        favorites = Favorite.objects.filter(
+            created__gte=now - timedelta(days=options['days'])
+        ).values_list('recipe_id', 'created').order_by()
+        for recipe_id, created in favorites.iterator(chunk_size=BATCH_SIZE):
+            age = (now - created).total_seconds()
+            scores[recipe_id] += 0.5 ** (age / half_life)
+        with transaction.atomic():
+            # update и bulk_update не трогают Recipe.updated.
+            Recipe.objects.filter(trending__gt=0).exclude(
+                pk__in=list(scores)
+            ).update(trending=0)
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=recipe_id, trending=score)
+                    for recipe_id, score in scores.items()
+                ],
+                ['trending'],
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг пересчитан для {len(scores)} рецептов'
+        ))
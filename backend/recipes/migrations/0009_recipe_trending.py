@@ -0,0 +1,39 @@
+# Generated by Django 3.2 on 2026-10-18 19:27
+
+import datetime
+
+from django.db import migrations, models
+
+# Дата для избранного, добавленного до этой миграции. Настоящая дата
+# неизвестна, а время миграции сделало бы всё старое избранное свежим
+# для trending, поэтому берётся дата заведомо вне окна.
+HISTORICAL_CREATED = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=HISTORICAL_CREATED, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, verbose_name='Популярность за последнее время'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-pub_date'], name='recipe_trending_idx'),
+        ),
+    ]
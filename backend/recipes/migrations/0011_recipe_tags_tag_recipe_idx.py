@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+# Уникальный индекс (recipe_id, tag_id) у промежуточной таблицы уже есть,
+# для фильтра ленты по тегам нужен обратный порядок колонок.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx',
+        ),
+    ]
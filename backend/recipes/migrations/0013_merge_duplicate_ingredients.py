@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает копии ингредиентов, оставшиеся от повторных load_data."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in duplicates:
+        extra = list(Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit']
+        ).exclude(pk=row['keep']).values_list('pk', flat=True))
+        for model, owner in (
+            (RecipeIngredient, 'recipe_id'),
+            (ShoppingCartIngredient, 'user_id'),
+        ):
+            for item in model.objects.filter(ingredient_id__in=extra):
+                kept, _ = model.objects.get_or_create(
+                    ingredient_id=row['keep'],
+                    defaults={'amount': 0},
+                    **{owner: getattr(item, owner)}
+                )
+                kept.amount += item.amount
+                kept.save(update_fields=('amount',))
+                item.delete()
+        Ingredient.objects.filter(pk__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_drop_redundant_user_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
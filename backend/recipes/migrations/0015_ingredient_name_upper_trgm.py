@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+# icontains и istartswith в PostgreSQL сравнивают UPPER(name::text),
+# индекс 0005 по самому name такие условия не покрывает.
+def create_upper_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_trgm '
+        'ON recipes_ingredient USING gin ((UPPER(name::text)) gin_trgm_ops)'
+    )
+
+
+def drop_upper_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_name_upper_trgm'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_upper_trigram_index, drop_upper_trigram_index
+        ),
+    ]
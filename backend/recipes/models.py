@@ -1,7 +1,8 @@
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from foodgram.querysets import RelationQuerySet
 from foodgram.settings import MAX_LENGTH
-from users.models import User
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -9,8 +10,7 @@ class Ingredient(models.Model):
 
     name = models.CharField(
         max_length=MAX_LENGTH,
-        verbose_name='Ингредиент',
-        db_index=True
+        verbose_name='Ингредиент'
     )
     measurement_unit = models.CharField(
         max_length=MAX_LENGTH,
@@ -20,6 +20,13 @@ class Ingredient(models.Model):
     class Meta:
         ordering = ('name',)
         verbose_name = 'Ингредиент'
+        # Индекс ограничения начинается с name и заменяет одиночный.
+        constraints = (
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -57,6 +64,61 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов с отметками текущего пользователя."""
+
+    def with_details(self, user):
+        """Подгружает всё, что нужно для RecipeSerializer, за один проход.
+
+        Теги, ингредиенты с их названиями и подписка пользователя на
+        авторов загружаются фиксированным числом запросов на страницу.
+        """
+        prefetches = [
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        ]
+        if not user.is_anonymous:
+            prefetches.append(
+                models.Prefetch(
+                    'author__following',
+                    queryset=Follow.objects.filter(user=user),
+                    to_attr='viewer_follows',
+                )
+            )
+        return self.select_related('author').prefetch_related(
+            *prefetches
+        ).annotate_user_flags(user)
+
+    def annotate_user_flags(self, user):
+        """Добавляет is_favorited и is_in_shopping_cart одним запросом."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     """Основная модель для приложения."""
 
@@ -70,7 +132,7 @@ class Recipe(models.Model):
         verbose_name='Автор',
         on_delete=models.SET_NULL,
         related_name='recipes',
-        db_index=True,
+        db_index=False,
         null=True
     )
     ingredients = models.ManyToManyField(
@@ -93,6 +155,11 @@ class Recipe(models.Model):
         upload_to='recipe_images/',
         verbose_name='Ссылка на картинку на сайте'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Уменьшенные копии картинки'
+    )
     cooking_time = models.PositiveSmallIntegerField(
         default=1,
         validators=[MinValueValidator(
@@ -105,15 +172,55 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках покупок'
+    )
+    # Пересчитывается командой refresh_recipe_scores.
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Популярность за последнее время'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('-trending', '-pub_date'),
+                name='recipe_trending_idx'
+            ),
+            # Заменяет одиночный индекс по author_id.
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def get_ingredient_amounts(self):
+        """Словарь {ingredient_id: amount} для ингредиентов рецепта."""
+        return dict(
+            self.recipe_ingredients.values_list('ingredient_id', 'amount')
+        )
+
 
 class RecipeIngredient(models.Model):
     """Модель RecipeIngredient."""
@@ -159,7 +266,8 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
         verbose_name='Пользователь',
-        db_index=True
+        # Запросы по пользователю обслуживает unique_user_recipe.
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -168,6 +276,13 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         db_index=True
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
+
+    objects = RelationQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -192,7 +307,8 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
         related_name='shopping_cart',
-        db_index=True
+        # Запросы по пользователю обслуживает unique_shopping_cart.
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -202,6 +318,8 @@ class ShoppingCart(models.Model):
         db_index=True
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -215,3 +333,116 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} в списке покупок у {self.user}'
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+    """Инкрементальное обновление сводного списка покупок."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: amount} к спискам users.
+
+        Недостающие строки сначала вставляются с нулём через
+        ON CONFLICT DO NOTHING, затем все строки меняются одним UPDATE.
+        Параллельная вставка той же пары ждёт первую транзакцию и
+        пропускается, а не падает на уникальном индексе, и обе дельты
+        складываются.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        user_ids = sorted(user_ids)
+        if not user_ids:
+            return
+        with transaction.atomic():
+            # Один порядок вставки во всех транзакциях против дедлоков.
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=0
+                    )
+                    for user_id in user_ids
+                    for ingredient_id in sorted(deltas)
+                    if deltas[ingredient_id] > 0
+                ),
+                ignore_conflicts=True
+            )
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            ).update(amount=models.F('amount') + models.Case(
+                *(
+                    models.When(ingredient_id=ingredient_id, then=delta)
+                    for ingredient_id, delta in deltas.items()
+                ),
+                output_field=models.IntegerField(),
+            ))
+            self.filter(
+                user_id__in=user_ids, amount__lte=0
+            ).delete()
+
+    def add_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], recipe.get_ingredient_amounts())
+
+    def remove_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in recipe.get_ingredient_amounts().items()
+        })
+
+    def change_recipe(self, recipe, old_amounts):
+        """Переносит в корзины правку ингредиентов recipe.
+
+        old_amounts — результат get_ingredient_amounts до правки.
+        """
+        deltas = recipe.get_ingredient_amounts()
+        for ingredient_id, amount in old_amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        self.apply_deltas(
+            recipe.shopping_cart.values_list('user_id', flat=True), deltas
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сводный список покупок пользователя.
+
+    Хранит сумму количества каждого ингредиента по всем рецептам
+    в корзине, чтобы скачивание списка было одним чтением по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients',
+        db_index=False
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_ingredients'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок у {self.user}'
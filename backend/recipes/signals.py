@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.models import User
+
+from .cache import bump_version
+from .images import delete_variants
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingCartIngredient, Tag)
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно меняет счётчик, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_ingredients(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в сводный список покупок."""
+    if created:
+        ShoppingCartIngredient.objects.add_recipe(
+            instance.user_id, instance.recipe
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_ingredients(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из сводного списка покупок.
+
+    Срабатывает до удаления, поэтому ингредиенты рецепта ещё доступны
+    и при каскадном удалении самого рецепта.
+    """
+    ShoppingCartIngredient.objects.remove_recipe(
+        instance.user_id, instance.recipe
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_catalogue_version(sender, **kwargs):
+    """Сбрасывает закэшированные ответы справочников.
+
+    Версия меняется после коммита: иначе другой процесс успел бы
+    собрать ответ по старым данным и сохранить его под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            'favorites_count', 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def count_shopping_cart(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            'in_carts_count', 1
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def uncount_shopping_cart(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'in_carts_count', -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, **kwargs):
+    if created and instance.author_id:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    if instance.author_id:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_variants(sender, instance, **kwargs):
+    """Удаляет файлы уменьшенных копий, когда удаление закоммичено."""
+    variants = instance.image_variants
+    if variants:
+        transaction.on_commit(lambda: delete_variants(variants))
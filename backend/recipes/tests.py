@@ -0,0 +1,429 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from users.models import User
+
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartIngredient, Tag)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Нужны блокировки PostgreSQL.'
+)
+class ShoppingCartIngredientRaceTest(TransactionTestCase):
+    """Параллельные добавления с общим ингредиентом не теряют суммы."""
+
+    def test_concurrent_apply_deltas(self):
+        user = User.objects.create(username='buyer', email='b@example.com')
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        inserted = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    ShoppingCartIngredient.objects.apply_deltas(
+                        [user.pk], {ingredient.pk: 10}
+                    )
+                    inserted.set()
+                    release.wait(5)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        def second():
+            try:
+                inserted.wait(5)
+                # Упирается в незакоммиченную строку первого потока.
+                ShoppingCartIngredient.objects.apply_deltas(
+                    [user.pk], {ingredient.pk: 5}
+                )
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=first),
+                   threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        inserted.wait(5)
+        threads[1].join(0.5)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            ShoppingCartIngredient.objects.get(
+                user=user, ingredient=ingredient
+            ).amount,
+            15
+        )
+
+
+class ShoppingCartTotalsTest(TestCase):
+    """Сводный список покупок после правки рецепта в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.buyer = User.objects.create(
+            username='buyer', email='b@example.com'
+        )
+        cls.salt, cls.sugar, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Мука')
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#000000'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='Блины', image='recipe_images/test.png',
+            text='Описание'
+        )
+        cls.recipe.tags.set([cls.tag])
+        cls.rows = [
+            RecipeIngredient.objects.create(
+                recipe=cls.recipe, ingredient=ingredient, amount=amount
+            )
+            for ingredient, amount in ((cls.salt, 5), (cls.sugar, 10))
+        ]
+        ShoppingCart.objects.add(user=cls.buyer, recipe=cls.recipe)
+
+    def get_totals(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.buyer
+        ).values_list('ingredient__name', 'amount'))
+
+    def test_admin_inline_edit(self):
+        self.client.force_login(self.admin)
+        prefix = 'recipe_ingredients'
+        data = {
+            'name': self.recipe.name,
+            'author': self.admin.pk,
+            'text': self.recipe.text,
+            'tags': [self.tag.pk],
+            'image_variants': '{}',
+            'cooking_time': 1,
+            'favorites_count': 0,
+            'in_carts_count': 1,
+            'trending': 0,
+            f'{prefix}-TOTAL_FORMS': 3,
+            f'{prefix}-INITIAL_FORMS': 2,
+            # Соль удалена, сахар изменён, мука добавлена.
+            f'{prefix}-0-id': self.rows[0].pk,
+            f'{prefix}-0-recipe': self.recipe.pk,
+            f'{prefix}-0-ingredient': self.salt.pk,
+            f'{prefix}-0-amount': 5,
+            f'{prefix}-0-DELETE': 'on',
+            f'{prefix}-1-id': self.rows[1].pk,
+            f'{prefix}-1-recipe': self.recipe.pk,
+            f'{prefix}-1-ingredient': self.sugar.pk,
+            f'{prefix}-1-amount': 25,
+            f'{prefix}-2-recipe': self.recipe.pk,
+            f'{prefix}-2-ingredient': self.flour.pk,
+            f'{prefix}-2-amount': 200,
+        }
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipe.pk}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_totals(), {'Сахар': 25, 'Мука': 200})
+
+    def test_rebuild_fixes_only_drift(self):
+        salt, sugar = (
+            ShoppingCartIngredient.objects.get(
+                user=self.buyer, ingredient=ingredient
+            )
+            for ingredient in (self.salt, self.sugar)
+        )
+        sugar.amount = 1
+        sugar.save()
+        salt.delete()
+        extra = ShoppingCartIngredient.objects.create(
+            user=self.buyer, ingredient=self.flour, amount=7
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shopping_cart', check=True)
+        call_command('rebuild_shopping_cart', stdout=StringIO())
+        self.assertEqual(self.get_totals(), {'Соль': 5, 'Сахар': 10})
+        self.assertTrue(
+            ShoppingCartIngredient.objects.filter(pk=sugar.pk).exists()
+        )
+        self.assertFalse(
+            ShoppingCartIngredient.objects.filter(pk=extra.pk).exists()
+        )
+        call_command('rebuild_shopping_cart', check=True, stdout=StringIO())
+
+
+class RefreshRecipeScoresTest(TestCase):
+    """trending считается только по избранному за окно."""
+
+    def test_refresh(self):
+        author = User.objects.create(username='cook', email='c@example.com')
+        fresh, old, stale = (
+            Recipe.objects.create(
+                author=author, name=name, image='recipe_images/test.png',
+                text='Описание', trending=trending
+            )
+            for name, trending in (('Свежий', 0), ('Старый', 0),
+                                   ('Забытый', 3))
+        )
+        Favorite.objects.create(user=author, recipe=fresh)
+        Favorite.objects.create(user=author, recipe=old)
+        Favorite.objects.filter(recipe=old).update(
+            created=timezone.now() - timedelta(days=30)
+        )
+        updated = Recipe.objects.get(pk=fresh.pk).updated
+        call_command('refresh_recipe_scores', stdout=StringIO())
+        trending = dict(Recipe.objects.values_list('name', 'trending'))
+        self.assertAlmostEqual(trending['Свежий'], 1, places=3)
+        self.assertEqual(trending['Старый'], 0)
+        self.assertEqual(trending['Забытый'], 0)
+        self.assertEqual(Recipe.objects.get(pk=fresh.pk).updated, updated)
+
+
+class ImageVariantsTest(TestCase):
+    """Варианты картинок: досоздание командой и удаление с рецептом."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800)).save(buffer, 'PNG')
+        image = default_storage.save(
+            'recipe_images/old.png', ContentFile(buffer.getvalue())
+        )
+        author = User.objects.create(username='cook', email='c@example.com')
+        self.recipe, self.broken = (
+            Recipe.objects.create(
+                author=author, name=name, image=image_name, text='Описание'
+            )
+            for name, image_name in (
+                ('Старый', image), ('Без файла', 'recipe_images/lost.png')
+            )
+        )
+
+    def test_backfill_and_delete(self):
+        stderr = StringIO()
+        call_command(
+            'generate_image_variants', workers=1,
+            stdout=StringIO(), stderr=stderr
+        )
+        self.assertIn(f'Рецепт {self.broken.pk}', stderr.getvalue())
+        self.recipe.refresh_from_db()
+        paths = [
+            path
+            for variant in self.recipe.image_variants.values()
+            for path in variant.values()
+        ]
+        self.assertEqual(
+            set(self.recipe.image_variants),
+            set(settings.RECIPE_IMAGE_VARIANTS)
+        )
+        self.assertTrue(all(default_storage.exists(path) for path in paths))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertFalse(any(default_storage.exists(path) for path in paths))
+
+
+class ImportIngredientsTest(TestCase):
+    """Импорт считает вставленными только строки, попавшие в таблицу."""
+
+    def import_csv(self, rows, **options):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8'
+        ) as file:
+            file.write('\n'.join(rows))
+            file.flush()
+            stdout = StringIO()
+            call_command('import_ingredients', file.name, stdout=stdout,
+                         **options)
+        return stdout.getvalue()
+
+    def test_counts(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        rows = ['Соль,г', 'Сахар,г', 'Сахар,г', 'Мука,г', 'плохая строка']
+        self.assertIn(
+            'Добавлено 2, уже были 2, с ошибками 1', self.import_csv(rows)
+        )
+        self.assertIn(
+            'Добавлено 0, уже были 4, с ошибками 1', self.import_csv(rows)
+        )
+
+    def test_ignored_conflicts_not_counted(self):
+        bulk_create = QuerySet.bulk_create
+
+        def lose_first(queryset, objs, *args, **kwargs):
+            # Первую строку вставка пропустила, как при конфликте.
+            return bulk_create(queryset, list(objs)[1:], *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', lose_first):
+            output = self.import_csv(['Соль,г', 'Сахар,г', 'Мука,г'])
+        self.assertIn('Добавлено 2, уже были 1', output)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+class RelationQuerySetTest(TestCase):
+    """add() и remove() отправляют сигналы с сохранённым объектом."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='fan', email='f@example.com')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', image='recipe_images/test.png',
+            text='Описание'
+        )
+        self.received = []
+        for signal in (post_save, pre_delete, post_delete):
+            signal.connect(self.receive, sender=Favorite)
+            self.addCleanup(signal.disconnect, self.receive, sender=Favorite)
+
+    def receive(self, signal, instance, **kwargs):
+        self.received.append((signal, instance.pk))
+
+    def test_add_and_remove(self):
+        self.assertTrue(
+            Favorite.objects.add(user=self.user, recipe=self.recipe)
+        )
+        self.assertFalse(
+            Favorite.objects.add(user=self.user, recipe=self.recipe)
+        )
+        pk = Favorite.objects.get().pk
+        self.assertEqual(self.received, [(post_save, pk)])
+        self.assertTrue(
+            Favorite.objects.remove(user=self.user, recipe_id=self.recipe.pk)
+        )
+        self.assertFalse(
+            Favorite.objects.remove(user=self.user, recipe_id=self.recipe.pk)
+        )
+        self.assertEqual(
+            self.received,
+            [(post_save, pk), (pre_delete, pk), (post_delete, pk)]
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Нужны блокировки PostgreSQL.'
+)
+class RelationQuerySetRaceTest(TransactionTestCase):
+    """Параллельные add() и remove() одной связи меняют счётчик один раз."""
+
+    def test_concurrent_remove(self):
+        users = [
+            User.objects.create(username=f'fan{number}',
+                                email=f'f{number}@example.com')
+            for number in range(2)
+        ]
+        recipe = Recipe.objects.create(
+            author=users[0], name='Рецепт', image='recipe_images/test.png',
+            text='Описание'
+        )
+        for user in users:
+            Favorite.objects.add(user=user, recipe=recipe)
+        removed = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    results.append(Favorite.objects.remove(
+                        user=users[0], recipe_id=recipe.pk
+                    ))
+                    removed.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        def second():
+            try:
+                removed.wait(5)
+                # Ждёт блокировку строки, которую удаляет первый поток.
+                results.append(Favorite.objects.remove(
+                    user=users[0], recipe_id=recipe.pk
+                ))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=first),
+                   threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        removed.wait(5)
+        threads[1].join(0.5)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False, True])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_concurrent_add(self):
+        user = User.objects.create(username='fan', email='f@example.com')
+        recipe = Recipe.objects.create(
+            author=user, name='Рецепт', image='recipe_images/test.png',
+            text='Описание'
+        )
+        added = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    results.append(Favorite.objects.add(
+                        user=user, recipe=recipe
+                    ))
+                    added.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        def second():
+            try:
+                added.wait(5)
+                # Упирается в незакоммиченную строку первого потока.
+                results.append(Favorite.objects.add(
+                    user=user, recipe=recipe
+                ))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=first),
+                   threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        added.wait(5)
+        threads[1].join(0.5)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False, True])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from foodgram.querysets import RelationQuerySet
 
 
 class User(AbstractUser):
@@ -24,6 +25,14 @@ class User(AbstractUser):
         verbose_name='Фамилия',
         max_length=150
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0
+    )
 
     class Meta:
         ordering = ('id',)
@@ -51,6 +60,8 @@ class Follow(models.Model):
         verbose_name='Автор постов',
         db_index=True)
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(